@@ -1,10 +1,19 @@
 import os
+import click
 from flask import Flask
+from flask.cli import with_appcontext
 from flask_cors import CORS
 from config import Config
-from extension import db, mail, bcrypt
+from extension import db, mail
+from hashing import passwords
 from routes import register_routes
 from model import Account
+from migrations import run_migrations
+from utilities import mail_dispatcher
+from storage import license_uploader
+from metrics import db_metrics, request_profiler
+from dispatch import dispatch_engine
+from message_writer import message_writer
 
 def create_app():
     app = Flask(__name__)
@@ -26,46 +35,81 @@ def create_app():
 
 
     db.init_app(app)
+    db_metrics.init_app(app)
+    request_profiler.init_app(app)
     mail.init_app(app)
-    bcrypt.init_app(app)
+    passwords.init_app(app)
+    mail_dispatcher.init_app(app)
+    license_uploader.init_app(app)
+    dispatch_engine.init_app(app)
+    message_writer.init_app(app)
     register_routes(app)
+    app.cli.add_command(init_db_command)
+    app.cli.add_command(seed_admin_command)
+    app.cli.add_command(sweep_licenses_command)
 
     return app
 
-app = create_app()
+def init_db():
+    db.create_all()
+    run_migrations()
+    print("Database tables verified/created.")
+
+def seed_admin():
+    admin_email = os.getenv("ADMIN_EMAIL", "admin@system.com")
+    admin_pass = os.getenv("ADMIN_PASSWORD", "admin123")
+
+    admin_exists = Account.query.filter_by(email=admin_email).first()
+
+    if not admin_exists:
+
+        hashed_password = passwords.hash(admin_pass)
+
+        new_admin = Account(
+            email=admin_email,
+            password=hashed_password,
+            role='Admin',
+            is_temp_password=False,
+            is_verified=True
+        )
+        db.session.add(new_admin)
+        try:
+            db.session.commit()
+            print(f"Admin initialized with hashed password: {admin_email}")
+        except Exception as e:
+            db.session.rollback()
+            print(f"Failed to initialize admin: {e}")
+    else:
+        print("Admin account already present.")
 
-def initialize_system():
+def initialize_system(app):
+    # Schema DDL and admin seeding are a deploy step (`flask --app app init-db`, then `seed-admin`),
+    # not something every worker should do on import
     with app.app_context():
-        db.create_all()
-        print("Database tables verified/created.")
-
-        admin_email = os.getenv("ADMIN_EMAIL", "admin@system.com")
-        admin_pass = os.getenv("ADMIN_PASSWORD", "admin123")
-        
-        admin_exists = Account.query.filter_by(email=admin_email).first()
-        
-        if not admin_exists:
-           
-            hashed_password = bcrypt.generate_password_hash(admin_pass).decode('utf-8')
-
-            new_admin = Account(
-                email=admin_email,
-                password=hashed_password, 
-                role='Admin',
-                is_temp_password=False,
-                is_verified=True
-            )
-            db.session.add(new_admin)
-            try:
-                db.session.commit()
-                print(f"Admin initialized with hashed password: {admin_email}")
-            except Exception as e:
-                db.session.rollback()
-                print(f"Failed to initialize admin: {e}")
-        else:
-            print("Admin account already present.")
-
-initialize_system()
+        init_db()
+        seed_admin()
+
+@click.command('init-db')
+@with_appcontext
+def init_db_command():
+    """Create missing tables and apply the start-up migrations."""
+    init_db()
+
+@click.command('seed-admin')
+@with_appcontext
+def seed_admin_command():
+    """Create the admin account from ADMIN_EMAIL / ADMIN_PASSWORD if it is missing."""
+    seed_admin()
+
+@click.command('sweep-licenses')
+@with_appcontext
+def sweep_licenses_command():
+    """Retry license uploads left 'pending' by a crash or restart (run from cron)."""
+    retried, failed = license_uploader.sweep()
+    print(f"License sweep: {retried} retried, {failed} marked failed")
+
+app = create_app()
 
 if __name__ == "__main__":
-    app.run(debug=True, host="localhost", port=5000)
\ No newline at end of file
+    initialize_system(app)
+    app.run(debug=True, host="localhost", port=5000)
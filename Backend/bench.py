@@ -0,0 +1,496 @@
+"""Micro-benchmarks for the hot paths tuned in this backend.
+
+    python bench.py triage [--rows 10000]
+    python bench.py startup
+    python bench.py indexes [--rows 10000]
+    python bench.py polls | history | messages [--rows 10000]
+    python bench.py hashing [--rounds 12]
+    python bench.py dispatch [--rows 2000]
+    python bench.py chat [--rows 500]
+    python bench.py --list
+
+Each benchmark prints best-of-N timings. The database-backed ones build a
+throwaway SQLite file, so nothing here touches DATABASE_URL's real data.
+"""
+import argparse
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCHES = {}
+
+def bench(name):
+    def register(fn):
+        BENCHES[name] = fn
+        return fn
+    return register
+
+def best_of(fn, repeat=5):
+    """Fastest of `repeat` runs, in milliseconds."""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+def report(label, ms, count=None):
+    rate = f"  {count / (ms / 1000):>12,.0f}/s" if count else ""
+    print(f"  {label:<44} {ms:>10.2f} ms{rate}")
+
+def scratch_app():
+    """Imports the app against an empty SQLite file with the schema created."""
+    path = os.path.join(tempfile.mkdtemp(prefix='curamind-bench-'), 'bench.db')
+    os.environ['DATABASE_URL'] = 'sqlite:///' + path
+    os.environ.setdefault('SECRET_KEY', 'bench')
+    os.environ['MAIL_QUEUE_ENABLED'] = 'False'
+    # The bench times slow paths on purpose; don't log each one
+    os.environ.setdefault('SLOW_QUERY_MS', '1e9')
+    import app as appmod
+    with appmod.app.app_context():
+        appmod.init_db()
+    return appmod.app
+
+def seed_synthetic(app, rows):
+    """Bulk-inserts a realistic spread of accounts, sessions, consultations, messages and OTPs."""
+    from datetime import date, datetime, timedelta
+    from sqlalchemy import insert
+    from extension import db
+    from model import Account, User, Doctor, TriageSession, Consultation, Message, Otp
+
+    rng = random.Random(1)
+    n_users, n_doctors = rows, max(rows // 10, 1)
+    now = datetime.utcnow()
+    with app.app_context():
+        db.session.execute(insert(Account), [
+            {"id": i, "email": f"acc{i}@bench", "password": "x", "role": "User" if i <= n_users else "Doctor",
+             "is_verified": rng.random() < 0.9, "is_temp_password": False}
+            for i in range(1, n_users + n_doctors + 1)])
+        db.session.execute(insert(User), [
+            {"id": i, "acc_id": i, "full_name": f"User {i}", "phone_number": f"u{i}", "address": "x",
+             "dob": date(1990, 1, 1)} for i in range(1, n_users + 1)])
+        db.session.execute(insert(Doctor), [
+            {"id": i, "acc_id": n_users + i, "full_name": f"Doctor {i}", "phone_number": f"d{i}",
+             "area_of_specialization": rng.choice(("Orthopedics", "General", "Sports Medicine")),
+             "license_no": f"L{i}", "dob": date(1980, 1, 1), "is_available_online": rng.random() < 0.05}
+            for i in range(1, n_doctors + 1)])
+        # Two sessions per patient: one finished, a few still open
+        db.session.execute(insert(TriageSession), [
+            {"id": i, "user_id": (i - 1) % n_users + 1, "v0_age": 30, "answered_mask": 0, "value_mask": 0,
+             "final_flag": None if rng.random() < 0.05 else rng.choice(("RED", "YELLOW", "GREEN", "ABANDONED")),
+             "created_at": now - timedelta(minutes=i)} for i in range(1, 2 * n_users + 1)])
+        db.session.execute(insert(Consultation), [
+            {"id": i, "patient_id": (i - 1) % n_users + 1, "doctor_id": rng.randint(1, n_doctors), "triage_id": i,
+             "status": rng.choice(("completed", "completed", "completed", "rejected", "accepted")),
+             "created_at": now - timedelta(minutes=i)} for i in range(1, n_users + 1)])
+        db.session.execute(insert(Message), [
+            {"consultation_id": rng.randint(1, n_users), "sender_id": 1, "content": "hello", "timestamp": now}
+            for _ in range(5 * rows)])
+        db.session.execute(insert(Otp), [
+            {"email": f"acc{rng.randint(1, n_users)}@bench", "otp": "123456", "expires_at": now,
+             "used": rng.random() < 0.9} for _ in range(rows)])
+        db.session.commit()
+    return n_users, n_doctors
+
+def hot_queries(n_users, n_doctors):
+    """(label, select) for the lookups the indexes were added for."""
+    from sqlalchemy import select
+    from model import Account, User, Doctor, TriageSession, Consultation, Message, Otp
+
+    acc, doctor, cons = n_users // 2, n_doctors // 2, n_users // 2
+    return [
+        ("chat: patient + open triage session", select(User.id, TriageSession.id)
+            .outerjoin(TriageSession, (TriageSession.user_id == User.id) & TriageSession.final_flag.is_(None))
+            .where(User.acc_id == acc).order_by(TriageSession.id.desc()).limit(1)),
+        ("dispatch: doctor's open consultations", select(Consultation.id)
+            .where(Consultation.doctor_id == doctor, Consultation.status.in_(('pending', 'accepted')))),
+        ("request: open request for a triage", select(Consultation.id)
+            .where(Consultation.triage_id == cons, Consultation.status.in_(('pending', 'queued'))).limit(1)),
+        ("patient: consultation history", select(Consultation.id).where(Consultation.patient_id == acc)),
+        ("chat poll: messages after id", select(Message.id)
+            .where(Message.consultation_id == cons, Message.id > 0).order_by(Message.id).limit(50)),
+        ("otp: unused codes for an email", select(Otp.id).where(Otp.email == f"acc{acc}@bench", Otp.used == False)),
+        ("admin: verified doctors", select(Account.id).where(Account.role == 'Doctor', Account.is_verified == True)),
+        ("admin: triage history page", select(TriageSession.id)
+            .order_by(TriageSession.created_at.desc(), TriageSession.id.desc()).limit(50)),
+        ("roster: online doctors", select(Doctor.id, Doctor.full_name, Doctor.area_of_specialization,
+                                          Doctor.specialty_key, Doctor.hospital_name)
+            .where(Doctor.is_available_online == True).order_by(Doctor.id)),
+    ]
+
+def explain(conn, stmt):
+    sql = str(stmt.compile(dialect=conn.dialect, compile_kwargs={"literal_binds": True}))
+    prefix = "EXPLAIN QUERY PLAN " if conn.dialect.name == 'sqlite' else "EXPLAIN "
+    return "; ".join(str(row[-1]) for row in conn.exec_driver_sql(prefix + sql))
+
+@bench('indexes')
+def bench_indexes(args):
+    """Query plans and latency of the indexed lookups, with and without the indexes."""
+    from extension import db
+    app = scratch_app()
+    n_users, n_doctors = seed_synthetic(app, args.rows)
+    queries = hot_queries(n_users, n_doctors)
+
+    with app.app_context():
+        indexes = [index for table in db.metadata.sorted_tables for index in table.indexes]
+        for phase in ("with indexes", "without indexes"):
+            print(f"{phase} ({args.rows} patients, {5 * args.rows} messages):")
+            with db.engine.connect() as conn:
+                conn.exec_driver_sql("ANALYZE")
+                for label, stmt in queries:
+                    ms = best_of(lambda: conn.execute(stmt).all(), args.repeat)
+                    report(label, ms)
+                    print(f"      {explain(conn, stmt)}")
+                if phase == "with indexes":
+                    for index in indexes:
+                        conn.exec_driver_sql(f"DROP INDEX {index.name}")
+                    conn.commit()
+
+@bench('polls')
+def bench_polls(args):
+    """Steady-state /otochat/messages poll (after_id = newest) as a chat grows."""
+    from sqlalchemy import insert
+    from extension import db
+    from model import Account, Consultation, Message, TriageSession, User
+    from datetime import date, datetime
+    app = scratch_app()
+    with app.app_context():
+        db.session.add(Account(id=1, email="p@bench", password="x", role="User"))
+        db.session.add(User(id=1, acc_id=1, full_name="P", phone_number="1", address="x", dob=date(1990, 1, 1)))
+        db.session.add(TriageSession(id=1, user_id=1))
+        db.session.add(Consultation(id=1, patient_id=1, triage_id=1, status='accepted'))
+        db.session.commit()
+
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['account_id'] = 1
+    size, last_id = 0, 0
+    for target in (100, 1000, args.rows):
+        with app.app_context():
+            db.session.execute(insert(Message), [
+                {"consultation_id": 1, "sender_id": 1, "content": "hello", "timestamp": datetime.utcnow()}
+                for _ in range(target - size)])
+            db.session.commit()
+        size = target
+        last_id = client.get('/otochat/messages/1?limit=1').get_json()['last_id']
+        report(f"poll with nothing new, {size} messages",
+               best_of(lambda: client.get(f'/otochat/messages/1?after_id={last_id}'), args.repeat))
+        report(f"poll after 1 new message, {size} messages",
+               best_of(lambda: client.get(f'/otochat/messages/1?after_id={last_id - 1}'), args.repeat))
+
+@bench('history')
+def bench_history(args):
+    """Opening a long chat: newest page, an older page and the streamed export."""
+    from sqlalchemy import insert
+    from extension import db
+    from model import Account, Consultation, Message, TriageSession, User
+    from datetime import date, datetime
+    app = scratch_app()
+    with app.app_context():
+        db.session.add(Account(id=1, email="p@bench", password="x", role="User"))
+        db.session.add(User(id=1, acc_id=1, full_name="P", phone_number="1", address="x", dob=date(1990, 1, 1)))
+        db.session.add(TriageSession(id=1, user_id=1))
+        db.session.add(Consultation(id=1, patient_id=1, triage_id=1, status='accepted'))
+        db.session.execute(insert(Message), [
+            {"consultation_id": 1, "sender_id": 1, "content": "hello " * 10, "timestamp": datetime.utcnow()}
+            for _ in range(args.rows)])
+        db.session.commit()
+
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['account_id'] = 1
+    print(f"{args.rows} messages in one consultation:")
+    report("newest page (default)", best_of(lambda: client.get('/otochat/messages/1'), args.repeat))
+    report("older page (before_id)",
+           best_of(lambda: client.get(f'/otochat/messages/1?before_id={args.rows // 2}'), args.repeat))
+    report("whole history as one catch-up (after_id=0)",
+           best_of(lambda: client.get(f'/otochat/messages/1?after_id=0&limit=200'), args.repeat))
+    report("streamed export (export=1)",
+           best_of(lambda: client.get('/otochat/messages/1?export=1').get_data(), args.repeat), args.rows)
+
+@bench('hashing')
+def bench_hashing(args):
+    """bcrypt logins/sec: inline on request threads vs the process pool."""
+    from concurrent.futures import ThreadPoolExecutor
+    from hashing import PasswordHasher
+
+    cores = os.cpu_count() or 1
+    logins = max(cores * 4, 8)
+
+    app = type('App', (), {'config': {'BCRYPT_LOG_ROUNDS': args.rounds, 'PASSWORD_HASH_WORKERS': 0}})()
+    inline = PasswordHasher()
+    inline.init_app(app)
+    hashed = inline.hash("correct horse")
+    app.config['PASSWORD_HASH_WORKERS'] = cores
+    pooled = PasswordHasher()
+    pooled.init_app(app)
+    pooled.hash("warm up")  # the pool starts on first use; keep that out of the timings
+
+    print(f"{logins} concurrent logins at cost {args.rounds}, {cores} core(s):")
+    for label, hasher in (("inline", inline), ("process pool", pooled)):
+        with ThreadPoolExecutor(max_workers=logins) as threads:
+            ms = best_of(lambda: list(threads.map(lambda _: hasher.check(hashed, "correct horse"), range(logins))),
+                         args.repeat)
+        report(label, ms, logins)
+        print(f"      {logins / (ms / 1000) / cores:,.1f} logins/sec per core")
+
+@bench('messages')
+def bench_messages(args):
+    """Chat message inserts/sec through each MESSAGE_WRITE_MODE."""
+    from concurrent.futures import ThreadPoolExecutor
+    from datetime import date
+    from extension import db
+    from model import Account, Consultation, Message, TriageSession, User
+    from message_writer import MessageWriter, write_message
+    app = scratch_app()
+    with app.app_context():
+        db.session.add(Account(id=1, email="p@bench", password="x", role="User"))
+        db.session.add(User(id=1, acc_id=1, full_name="P", phone_number="1", address="x", dob=date(1990, 1, 1)))
+        db.session.add(TriageSession(id=1, user_id=1))
+        db.session.add(Consultation(id=1, patient_id=1, triage_id=1, status='accepted'))
+        db.session.commit()
+
+    senders = 32
+    def sync_send(i):
+        with app.app_context():
+            write_message(1, 1, f"message {i}")
+            db.session.remove()
+
+    print(f"{args.rows} messages from {senders} concurrent senders:")
+    with ThreadPoolExecutor(max_workers=senders) as threads:
+        start = time.perf_counter()
+        list(threads.map(sync_send, range(args.rows)))
+        report("sync (commit per message)", (time.perf_counter() - start) * 1000, args.rows)
+
+        for mode in ('group', 'async'):
+            app.config['MESSAGE_WRITE_MODE'] = mode
+            writer = MessageWriter()
+            writer.init_app(app)
+            start = time.perf_counter()
+            list(threads.map(lambda i: writer.submit(1, 1, f"message {i}"), range(args.rows)))
+            writer.close()  # async: wait for the buffer to drain
+            report(f"{mode} ({writer.batches} commits)", (time.perf_counter() - start) * 1000, args.rows)
+    app.config['MESSAGE_WRITE_MODE'] = 'sync'
+
+    with app.app_context():
+        assert db.session.query(Message).count() == 3 * args.rows
+
+@bench('dispatch')
+def bench_dispatch(args):
+    """Queue simulation: requests arrive, doctors finish, dispatch() refills them."""
+    import heapq
+    from datetime import date, datetime, timedelta
+    from sqlalchemy import insert, select, update
+    from extension import db
+    from model import Account, Consultation, Doctor, TriageSession, User
+    app = scratch_app()
+    # After scratch_app: dispatch pulls in config, which reads DATABASE_URL on import
+    from dispatch import dispatch_engine, triage_priority
+
+    rng = random.Random(1)
+    specialties = ("Orthopedics", "General", "Sports Medicine")
+    n_doctors, capacity, service_min = max(args.rows // 50, 3), 2, 15.0
+    # Arrivals at 90% of what the doctors can serve, so a queue forms and drains
+    arrival_gap = service_min / (n_doctors * capacity * 0.9)
+    with app.app_context():
+        db.session.execute(insert(Account), [
+            {"id": i, "email": f"acc{i}@bench", "password": "x", "role": "User" if i == 1 else "Doctor"}
+            for i in range(1, n_doctors + 2)])
+        db.session.add(User(id=1, acc_id=1, full_name="P", phone_number="1", address="x", dob=date(1990, 1, 1)))
+        for i in range(1, n_doctors + 1):
+            db.session.add(Doctor(id=i, acc_id=i + 1, full_name=f"Doctor {i}", phone_number=f"d{i}",
+                                  area_of_specialization=specialties[i % len(specialties)], license_no=f"L{i}",
+                                  dob=date(1980, 1, 1), is_available_online=True))
+        db.session.execute(insert(TriageSession), [
+            {"id": i, "user_id": 1, "final_flag": rng.choice(("RED", "YELLOW", "YELLOW", "GREEN", "GREEN"))}
+            for i in range(1, args.rows + 1)])
+        db.session.commit()
+        flags = dict(db.session.execute(select(TriageSession.id, TriageSession.final_flag)).all())
+
+    # (virtual minute, kind, consultation id) in time order
+    events, clock = [], 0.0
+    for cons_id in range(1, args.rows + 1):
+        clock += rng.expovariate(1 / arrival_gap)
+        heapq.heappush(events, (clock, 'arrive', cons_id))
+
+    base = datetime.utcnow()
+    arrived, waits, dispatch_ms = {}, [], []
+    start = time.perf_counter()
+    with app.app_context():
+        dispatch_engine.capacity = capacity
+        while events:
+            now, kind, cons_id = heapq.heappop(events)
+            if kind == 'arrive':
+                key = rng.choice(('',) + specialties).lower()
+                db.session.add(Consultation(id=cons_id, patient_id=1, triage_id=cons_id, status='queued',
+                                            specialty_key=key, priority=triage_priority(flags[cons_id]),
+                                            created_at=base + timedelta(minutes=now)))
+                db.session.commit()
+                arrived[cons_id] = now
+            else:
+                db.session.execute(update(Consultation).where(Consultation.id == cons_id)
+                                   .values(status='completed'))
+                db.session.commit()
+                key = None
+
+            t = time.perf_counter()
+            dispatch_engine.dispatch(key)
+            dispatch_ms.append((time.perf_counter() - t) * 1000)
+
+            # Whatever dispatch() just assigned: the doctor accepts and starts the consult
+            placed = db.session.execute(
+                select(Consultation.id).where(Consultation.status == 'pending')).scalars().all()
+            if placed:
+                db.session.execute(update(Consultation).where(Consultation.id.in_(placed))
+                                   .values(status='accepted'))
+                db.session.commit()
+            for placed_id in placed:
+                waits.append(now - arrived[placed_id])
+                heapq.heappush(events, (now + rng.expovariate(1 / service_min), 'complete', placed_id))
+    elapsed = time.perf_counter() - start
+
+    waits.sort()
+    print(f"{args.rows} requests, {n_doctors} doctors x {capacity} slots, "
+          f"{service_min:.0f} min mean consult, 90% load:")
+    print(f"  dispatched {len(waits)}, still queued {args.rows - len(waits)}")
+    print(f"  queue wait (simulated): mean {sum(waits) / len(waits):.1f} min, "
+          f"p95 {waits[int(len(waits) * 0.95)]:.1f} min")
+    dispatch_ms.sort()
+    print(f"  dispatch() calls: {len(dispatch_ms)}, mean {sum(dispatch_ms) / len(dispatch_ms):.2f} ms, "
+          f"p95 {dispatch_ms[int(len(dispatch_ms) * 0.95)]:.2f} ms")
+    report("time inside dispatch()", sum(dispatch_ms), len(waits))
+    report("whole simulation (wall, incl. commits)", elapsed * 1000, len(waits))
+
+@bench('chat')
+def bench_chat(args):
+    """Concurrent triage chats, start_triage through finalize_session: turn latency and throughput."""
+    from concurrent.futures import ThreadPoolExecutor
+    from datetime import date
+    from sqlalchemy import insert
+    from extension import db
+    from model import Account, TriageSession, User
+    app = scratch_app()
+    with app.app_context():
+        db.session.execute(insert(Account), [
+            {"id": i, "email": f"acc{i}@bench", "password": "x", "role": "User"} for i in range(1, args.rows + 1)])
+        db.session.execute(insert(User), [
+            {"id": i, "acc_id": i, "full_name": f"User {i}", "phone_number": f"u{i}", "address": "x",
+             "dob": date(1990, 1, 1)} for i in range(1, args.rows + 1)])
+        db.session.commit()
+
+    sessions = 16
+    def converse(acc_id):
+        # Mostly "no", so most chats run the whole questionnaire instead of exiting early
+        rng, client, turns = random.Random(acc_id), app.test_client(), []
+        message = 'start_triage'
+        while True:
+            start = time.perf_counter()
+            reply = client.post('/chat/message', json={'acc_id': acc_id, 'message': message}).get_json()
+            turns.append((time.perf_counter() - start) * 1000)
+            if reply.get('status') != 'active':
+                return turns, reply.get('flag')
+            message = 'yes' if rng.random() < 0.1 else 'no'
+
+    with ThreadPoolExecutor(max_workers=sessions) as threads:
+        start = time.perf_counter()
+        results = list(threads.map(converse, range(1, args.rows + 1)))
+        elapsed = (time.perf_counter() - start) * 1000
+
+    turns = sorted(ms for chat_turns, _ in results for ms in chat_turns)
+    print(f"{args.rows} triage chats, {sessions} at a time, {len(turns)} turns:")
+    print(f"  turn latency: mean {sum(turns) / len(turns):.2f} ms, p95 {turns[int(len(turns) * 0.95)]:.2f} ms, "
+          f"max {turns[-1]:.2f} ms")
+    report("all chats (wall)", elapsed, args.rows)
+    report("  as turns", elapsed, len(turns))
+    with app.app_context():
+        finished = db.session.query(TriageSession).filter(TriageSession.final_flag.isnot(None)).count()
+    assert finished == args.rows and all(flag for _, flag in results)
+
+@bench('triage')
+def bench_triage(args):
+    """Ottawa rules: per-row run_triage_logic vs the NumPy batch path."""
+    from routes.triage import ANSWER_KEYS, run_triage_logic, run_triage_batch, encode_answers_batch
+
+    rng = random.Random(1)
+    int_rows = [dict({k: rng.choice((0, 1)) for k in ANSWER_KEYS}, V0_AGE=rng.choice((0.5, 12, 30, 70)))
+                for _ in range(args.rows)]
+    # What the chat front end and partner imports actually send: strings, ints and gaps
+    mixed_rows = [dict({k: rng.choice((0, 1, '0', '1', None)) for k in ANSWER_KEYS},
+                       V0_AGE=rng.choice((0.5, 12, '30', 70, None))) for _ in range(args.rows)]
+
+    run_triage_batch(int_rows[:10])  # import numpy outside the timings
+    for label, rows in (("int answers", int_rows), ("mixed answers", mixed_rows)):
+        assert run_triage_batch(rows) == [run_triage_logic(r) for r in rows]
+        print(f"{args.rows} rows, {label}:")
+        report("run_triage_logic loop", best_of(lambda: [run_triage_logic(r) for r in rows], args.repeat), args.rows)
+        report("run_triage_batch", best_of(lambda: run_triage_batch(rows), args.repeat), args.rows)
+        masks = encode_answers_batch(rows)
+        report("run_triage_batch, masks precomputed", best_of(lambda: run_triage_batch(rows, masks), args.repeat), args.rows)
+
+# Imported on first use rather than at boot (routes.triage, storage)
+DEFERRED_IMPORTS = ('numpy', 'PIL.Image', 'httpx')
+
+def importtime(code, env):
+    """Runs code under -X importtime; returns (wall ms, {module: (cumulative ms, direct imports)})."""
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], env=env,
+                          cwd=os.path.dirname(os.path.abspath(__file__)),
+                          capture_output=True, text=True, check=True)
+    wall = (time.perf_counter() - start) * 1000
+    modules, pending = {}, {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line.split('|')
+        depth = (len(name) - len(name.lstrip())) // 2
+        # A module is reported after everything it imported, one level deeper
+        children = pending.pop(depth + 1, [])
+        modules.setdefault(name.strip(), (int(cumulative) / 1000, children))
+        pending.setdefault(depth, []).append(name.strip())
+    return wall, modules
+
+@bench('startup')
+def bench_startup(args):
+    """Worker boot: `import app` under -X importtime, and what is deferred."""
+    env = dict(os.environ, SECRET_KEY='bench', MAIL_QUEUE_ENABLED='False',
+               DATABASE_URL='sqlite:///' + os.path.join(tempfile.mkdtemp(prefix='curamind-bench-'), 'bench.db'))
+
+    bare = min(importtime('pass', env)[0] for _ in range(args.repeat))
+    runs = [importtime('import app', env) for _ in range(args.repeat)]
+    wall, modules = min(runs, key=lambda run: run[0])
+    print(f"python -c 'import app' (best of {args.repeat}), includes create_app():")
+    report("interpreter start-up alone", bare)
+    report("import app", wall)
+    report("  of which imports (app, cumulative)", modules['app'][0])
+
+    print("Modules imported by app.py, largest first (cumulative):")
+    for name in sorted(modules['app'][1], key=lambda name: -modules[name][0])[:12]:
+        report("  " + name, modules[name][0])
+
+    print("Deferred to first use (cost on top of `import app`):")
+    for name in DEFERRED_IMPORTS:
+        assert name not in modules, f"{name} is imported at boot again"
+        extra = importtime(f'import app, {name}', env)[1]
+        report("  " + name, extra[name][0])
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('name', nargs='?', choices=sorted(BENCHES))
+    parser.add_argument('--list', action='store_true', help="list the benchmarks and exit")
+    parser.add_argument('--rows', type=int, default=10000, help="synthetic rows / messages to use")
+    parser.add_argument('--repeat', type=int, default=5, help="runs per timing; the best is reported")
+    parser.add_argument('--rounds', type=int, default=12, help="bcrypt cost for the hashing benchmark")
+    args = parser.parse_args(argv)
+
+    if args.list or not args.name:
+        for name, fn in sorted(BENCHES.items()):
+            print(f"{name:<12} {fn.__doc__}")
+        return
+    BENCHES[args.name](args)
+
+if __name__ == '__main__':
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    main()
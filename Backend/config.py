@@ -1,15 +1,79 @@
 import os
+import tempfile
 import dotenv
 
 dotenv.load_dotenv()
 
+def engine_options():
+    # Pool sizing is only passed when set: SQLite's in-memory pool rejects it
+    options = {
+        'pool_pre_ping': os.getenv('DB_POOL_PRE_PING', 'True') == 'True',
+        'pool_recycle': int(os.getenv('DB_POOL_RECYCLE', 1800)),
+    }
+    for key, env in (('pool_size', 'DB_POOL_SIZE'), ('max_overflow', 'DB_MAX_OVERFLOW'), ('pool_timeout', 'DB_POOL_TIMEOUT')):
+        if os.getenv(env):
+            options[key] = int(os.getenv(env))
+    return options
+
 class Config:
     SECRET_KEY = os.getenv('SECRET_KEY')
     SQLALCHEMY_DATABASE_URI = os.getenv('DATABASE_URL')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options()
+    # Statements at or above this many milliseconds are logged and listed in /admin/db_metrics
+    SLOW_QUERY_MS = float(os.getenv('SLOW_QUERY_MS', 200))
+    # Per-route latency/SQL profiling, exposed at /metrics. Scrapers send METRICS_TOKEN as a
+    # bearer token; without one only direct local requests (not via the reverse proxy) are served
+    PROFILING_ENABLED = os.getenv('PROFILING_ENABLED', 'False') == 'True'
+    PROFILING_SAMPLE_RATE = float(os.getenv('PROFILING_SAMPLE_RATE', 1.0))
+    METRICS_TOKEN = os.getenv('METRICS_TOKEN')
+
+    # bcrypt cost; existing hashes are upgraded on the next successful login
+    BCRYPT_LOG_ROUNDS = int(os.getenv('BCRYPT_LOG_ROUNDS', 12))
+    PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', min(4, os.cpu_count() or 1)))
     MAIL_SERVER = os.getenv('MAIL_SERVER')
     MAIL_PORT = int(os.getenv('MAIL_PORT', 587))
     MAIL_USE_TLS = os.getenv('MAIL_USE_TLS', 'True') == 'True'
     MAIL_USERNAME = os.getenv('MAILJET_API_KEY')
     MAIL_PASSWORD = os.getenv('MAILJET_SECRET_KEY')
     MAIL_DEFAULT_SENDER = os.getenv('MAIL_DEFAULT_SENDER')
+
+    # Background delivery through the mail_outbox table (False = send inline)
+    MAIL_QUEUE_ENABLED = os.getenv('MAIL_QUEUE_ENABLED', 'True') == 'True'
+    MAIL_QUEUE_POLL_INTERVAL = float(os.getenv('MAIL_QUEUE_POLL_INTERVAL', 5))
+    MAIL_MAX_ATTEMPTS = int(os.getenv('MAIL_MAX_ATTEMPTS', 5))
+    MAIL_RETRY_BACKOFF = float(os.getenv('MAIL_RETRY_BACKOFF', 30))
+    MAIL_SMTP_IDLE_TIMEOUT = float(os.getenv('MAIL_SMTP_IDLE_TIMEOUT', 60))
+    # Messages sent per SMTP session, and relay throttle in messages/sec (0 = unthrottled)
+    MAIL_BATCH_SIZE = int(os.getenv('MAIL_BATCH_SIZE', 50))
+    MAIL_RATE_LIMIT = float(os.getenv('MAIL_RATE_LIMIT', 0))
+
+    # Seconds the admin dashboard aggregates may be served from memory
+    DASHBOARD_CACHE_TTL = int(os.getenv('DASHBOARD_CACHE_TTL', 30))
+    # Online-doctor roster behind /doctor/available; dropped whenever availability changes
+    DOCTOR_ROSTER_CACHE_TTL = int(os.getenv('DOCTOR_ROSTER_CACHE_TTL', 60))
+    DOCTOR_PAGE_MAX = int(os.getenv('DOCTOR_PAGE_MAX', 100))
+    # Open (pending + accepted) consultations the dispatcher will give one doctor at once
+    DISPATCH_DOCTOR_CAPACITY = int(os.getenv('DISPATCH_DOCTOR_CAPACITY', 1))
+    CONSULTATION_STATUS_CACHE_TTL = int(os.getenv('CONSULTATION_STATUS_CACHE_TTL', 5))
+
+    # Chat message writes: 'sync' commits each message in the request,
+    # 'group' batches concurrent sends into one commit and waits for it,
+    # 'async' answers straight away and writes behind (buffered messages are lost on a crash)
+    MESSAGE_WRITE_MODE = os.getenv('MESSAGE_WRITE_MODE', 'sync')
+    MESSAGE_FLUSH_INTERVAL_MS = float(os.getenv('MESSAGE_FLUSH_INTERVAL_MS', 5))
+    MESSAGE_BATCH_SIZE = int(os.getenv('MESSAGE_BATCH_SIZE', 200))
+    MESSAGE_WRITE_TIMEOUT = float(os.getenv('MESSAGE_WRITE_TIMEOUT', 5))
+
+    # 'supabase' or 'local' (files under static/uploads, for offline/dev use)
+    STORAGE_BACKEND = os.getenv('STORAGE_BACKEND', 'supabase')
+    LOCAL_STORAGE_DIR = os.getenv('LOCAL_STORAGE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static', 'uploads'))
+    LOCAL_STORAGE_URL = os.getenv('LOCAL_STORAGE_URL', 'http://localhost:5000/static/uploads')
+    LICENSE_UPLOAD_WORKERS = int(os.getenv('LICENSE_UPLOAD_WORKERS', 2))
+    # Scans wait here until uploaded; `flask sweep-licenses` retries ones older than LICENSE_RETRY_AFTER seconds
+    LICENSE_SPOOL_DIR = os.getenv('LICENSE_SPOOL_DIR', os.path.join(tempfile.gettempdir(), 'curamind-license-spool'))
+    LICENSE_RETRY_AFTER = float(os.getenv('LICENSE_RETRY_AFTER', 600))
+    # Failed uploads are retried LICENSE_RETRY_BACKOFF * 2^n seconds later, up to LICENSE_MAX_ATTEMPTS tries
+    LICENSE_MAX_ATTEMPTS = int(os.getenv('LICENSE_MAX_ATTEMPTS', 5))
+    LICENSE_RETRY_BACKOFF = float(os.getenv('LICENSE_RETRY_BACKOFF', 30))
+    STORAGE_MAX_CONNECTIONS = int(os.getenv('STORAGE_MAX_CONNECTIONS', 10))
@@ -0,0 +1,102 @@
+from datetime import datetime, timezone
+from sqlalchemy import case, event, select, update
+from extension import db
+from model import Consultation, Doctor
+from config import Config
+from utilities import TTLCache
+
+# Which statuses each status may be entered from
+TRANSITIONS = {
+    'pending': ('queued',),
+    # Queued rows only move through DispatchEngine.claim, which checks specialty and capacity
+    'accepted': ('pending',),
+    'rejected': ('pending',),
+    'completed': ('pending', 'accepted'),
+}
+
+# cons_id -> status, read on the chat send path; entries are dropped once a
+# transition commits here, other processes see the change within the TTL
+status_cache = TTLCache(Config.CONSULTATION_STATUS_CACHE_TTL)
+
+def cached_status(cons_id):
+    """Current status of a consultation (None if it doesn't exist), served from status_cache."""
+    return status_cache.get_or_set(cons_id, lambda: db.session.execute(
+        select(Consultation.status).where(Consultation.id == cons_id)
+    ).scalar())
+
+def _forget_changed(session):
+    for cons_id in session.info.pop('status_changed', ()):
+        status_cache.invalidate(cons_id)
+
+def _drop_changed(session):
+    session.info.pop('status_changed', None)
+
+event.listen(db.session, 'after_commit', _forget_changed)
+event.listen(db.session, 'after_rollback', _drop_changed)
+
+class TransitionError(Exception):
+    """The consultation couldn't make the move.
+
+    current is its status at the time (None if it doesn't exist). missing is
+    True when the row is absent or isn't the caller's to change, as opposed
+    to having already moved on; handlers answer 404/403 vs 409 on it.
+    """
+
+    def __init__(self, cons_id, target, current, missing):
+        self.cons_id = cons_id
+        self.target = target
+        self.current = current
+        self.missing = missing
+        super().__init__(f"Consultation {cons_id} cannot become {target} from {current}")
+
+def transition(cons_id, target, condition, expected=None, **values):
+    """Moves a consultation to target with one conditional UPDATE.
+
+    The row only changes if it is still in one of the expected statuses and
+    satisfies condition (usually: assigned to this doctor), so two concurrent
+    clicks can never both win. The caller commits; on failure the session is
+    rolled back and TransitionError raised.
+    """
+    expected = expected or TRANSITIONS[target]
+    result = db.session.execute(
+        update(Consultation)
+        .where(Consultation.id == cons_id, condition, Consultation.status.in_(expected))
+        .values(status=target, **values)
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount != 1:
+        db.session.rollback()
+        row = db.session.execute(
+            select(Consultation.status, case((condition, True), else_=False))
+            .where(Consultation.id == cons_id)
+        ).first()
+        current, allowed = row if row else (None, False)
+        missing = current is None or not allowed
+        raise TransitionError(cons_id, target, current, missing)
+    db.session.info.setdefault('status_changed', set()).add(cons_id)
+
+def set_doctor_available(doctor_id, available):
+    # Written as a plain UPDATE so it never overwrites a concurrent change with a stale read
+    db.session.execute(
+        update(Doctor).where(Doctor.id == doctor_id).values(is_available_online=available)
+        .execution_options(synchronize_session=False)
+    )
+
+def accept(cons_id, doctor_id, mark_busy=True):
+    """Doctor takes a pending offer; mark_busy takes them offline until the chat ends."""
+    transition(cons_id, 'accepted', Consultation.doctor_id == doctor_id)
+    if mark_busy:
+        set_doctor_available(doctor_id, False)
+    db.session.commit()
+
+def reject(cons_id, doctor_id):
+    transition(cons_id, 'rejected', Consultation.doctor_id == doctor_id)
+    db.session.commit()
+
+def complete(cons_id, doctor_id, summary, release_doctor=False, expected=None):
+    """Closes the consultation with the doctor's summary; release_doctor puts them back online."""
+    transition(cons_id, 'completed', Consultation.doctor_id == doctor_id, expected,
+               clinical_summary=summary, ended_at=datetime.now(timezone.utc))
+    if release_doctor:
+        set_doctor_available(doctor_id, True)
+    db.session.commit()
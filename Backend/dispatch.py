@@ -0,0 +1,152 @@
+import threading
+from sqlalchemy import and_, func, or_, select
+from extension import db
+from model import Consultation, Doctor
+from events import publish_consultation_event
+from consultation_state import transition, TransitionError
+from triage_rules import RECOMMENDATIONS
+
+# Consultations that count against a doctor's capacity
+ACTIVE_STATUSES = ('pending', 'accepted')
+# Requests whose triage has no known flag go after every flagged one
+DEFAULT_PRIORITY = max(rec['priority'] for rec in RECOMMENDATIONS.values()) + 1
+
+def triage_priority(flag):
+    return RECOMMENDATIONS.get(flag, {}).get('priority', DEFAULT_PRIORITY)
+
+class DispatchEngine:
+    """Assigns queued consultation requests to online doctors.
+
+    Each specialty is its own queue, ordered by triage priority, then by how
+    long the request has waited. The queue lives in the database: the head
+    and a request's position are read through the ix_consultations_queued
+    partial index, so requests queued through another worker process are
+    placed by this one's triggers too. A request is handed out by a conditional
+    UPDATE that only succeeds while it is still queued and the doctor is under
+    DISPATCH_DOCTOR_CAPACITY, so several workers can dispatch at once
+    without double-assigning a request or overloading a doctor.
+    """
+
+    def __init__(self):
+        self.capacity = 1
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.capacity = app.config.get('DISPATCH_DOCTOR_CAPACITY', 1)
+
+    def queue_head(self, key):
+        """The most urgent, longest-waiting queued request for a specialty ('' = any)."""
+        return (
+            select(Consultation.id)
+            .where(Consultation.status == 'queued', Consultation.specialty_key == key)
+            .order_by(Consultation.priority, Consultation.created_at, Consultation.id)
+            .limit(1)
+        )
+
+    def enqueue(self, cons):
+        """Tries to place a freshly committed 'queued' consultation straight away."""
+        self.dispatch(cons.specialty_key or '')
+
+    def position(self, cons_id):
+        """1-based place in its queue, or None when it is no longer queued."""
+        row = db.session.execute(
+            select(Consultation.specialty_key, Consultation.priority, Consultation.created_at)
+            .where(Consultation.id == cons_id, Consultation.status == 'queued')
+        ).first()
+        if row is None:
+            return None
+        ahead = db.session.execute(
+            select(func.count(Consultation.id)).where(
+                Consultation.status == 'queued',
+                Consultation.specialty_key == row.specialty_key,
+                or_(Consultation.priority < row.priority,
+                    and_(Consultation.priority == row.priority,
+                         or_(Consultation.created_at < row.created_at,
+                             and_(Consultation.created_at == row.created_at, Consultation.id < cons_id))))
+            )
+        ).scalar()
+        return ahead + 1
+
+    def dispatch(self, specialty_key=None):
+        """Hands out as many queued requests as there is free capacity for.
+
+        Called whenever capacity may have appeared: a new request, a doctor
+        coming online, or a consultation finishing. Returns the number assigned.
+        """
+        with self._lock:
+            if specialty_key is not None:
+                keys = [specialty_key]
+            else:
+                keys = db.session.execute(
+                    select(Consultation.specialty_key).where(Consultation.status == 'queued').distinct()
+                ).scalars().all()
+            assigned = 0
+            for key in keys:
+                assigned += self._drain(key)
+            return assigned
+
+    def _drain(self, key):
+        assigned = 0
+        while True:
+            cons_id = db.session.execute(self.queue_head(key)).scalar()
+            if cons_id is None:
+                break
+            doctors = self.free_doctors(key)
+            if not doctors:
+                break
+
+            placed = False
+            for doctor_id in doctors:
+                if self.claim(cons_id, doctor_id):
+                    publish_consultation_event(cons_id, "status", status='pending', doctor_id=doctor_id)
+                    placed = True
+                    break
+                if not self._still_queued(cons_id):
+                    break
+
+            if placed:
+                assigned += 1
+            elif self._still_queued(cons_id):
+                # Every candidate filled up under us; wait for the next trigger
+                break
+        return assigned
+
+    def free_doctors(self, key):
+        """Online doctors matching the specialty with spare capacity, least loaded first."""
+        load = func.count(Consultation.id)
+        query = (
+            select(Doctor.id)
+            .outerjoin(Consultation, and_(Consultation.doctor_id == Doctor.id,
+                                          Consultation.status.in_(ACTIVE_STATUSES)))
+            .where(Doctor.is_available_online == True)
+            .group_by(Doctor.id)
+            .having(load < self.capacity)
+            .order_by(load, Doctor.id)
+        )
+        if key:
+            query = query.where(Doctor.specialty_key.contains(key, autoescape=True))
+        return db.session.execute(query).scalars().all()
+
+    def claim(self, cons_id, doctor_id):
+        """Atomically assigns cons_id to doctor_id. False if it was taken or the doctor is full."""
+        load = (
+            select(func.count(Consultation.id))
+            .where(Consultation.doctor_id == doctor_id, Consultation.status.in_(ACTIVE_STATUSES))
+            .scalar_subquery()
+        )
+        # Row lock on the doctor serializes concurrent claims against the same capacity
+        # (a no-op on SQLite, which serializes writers anyway)
+        db.session.execute(select(Doctor.id).where(Doctor.id == doctor_id).with_for_update())
+        try:
+            transition(cons_id, 'pending', load < self.capacity, doctor_id=doctor_id)
+        except TransitionError:
+            return False
+        db.session.commit()
+        return True
+
+    def _still_queued(self, cons_id):
+        return db.session.execute(
+            select(Consultation.status).where(Consultation.id == cons_id)
+        ).scalar() == 'queued'
+
+dispatch_engine = DispatchEngine()
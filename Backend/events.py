@@ -0,0 +1,86 @@
+import queue
+import threading
+
+
+class Subscription:
+    """A single listener on a broker channel. Events are buffered in a bounded queue."""
+
+    def __init__(self, broker, channel, maxsize=100):
+        self.broker = broker
+        self.channel = channel
+        self.queue = queue.Queue(maxsize=maxsize)
+
+    def get(self, timeout=None):
+        # Returns None when nothing arrived within the timeout
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class InProcessBroker:
+    """Pub/sub that fans events out to subscribers living in this process.
+
+    Anything exposing subscribe/unsubscribe/publish with the same signatures
+    (e.g. a Redis or local broker adapter) can be swapped in with set_broker.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._channels = {}
+
+    def subscribe(self, channel):
+        sub = Subscription(self, channel)
+        with self._lock:
+            self._channels.setdefault(channel, set()).add(sub)
+        return sub
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            subs = self._channels.get(sub.channel)
+            if subs:
+                subs.discard(sub)
+                if not subs:
+                    del self._channels[sub.channel]
+
+    def publish(self, channel, event):
+        with self._lock:
+            subs = list(self._channels.get(channel, ()))
+        for sub in subs:
+            try:
+                sub.queue.put_nowait(event)
+            except queue.Full:
+                # Slow consumer: drop the event, the client resyncs via after_id
+                pass
+        return len(subs)
+
+
+_broker = InProcessBroker()
+
+
+def get_broker():
+    return _broker
+
+
+def set_broker(broker):
+    global _broker
+    _broker = broker
+
+
+def consultation_channel(cons_id):
+    return f"consultation:{cons_id}"
+
+
+def publish_consultation_event(cons_id, event_type, **payload):
+    payload['type'] = event_type
+    payload['consultation_id'] = cons_id
+    return _broker.publish(consultation_channel(cons_id), payload)
@@ -1,7 +1,5 @@
 from flask_sqlalchemy import SQLAlchemy
 from flask_mail import Mail
-from flask_bcrypt import Bcrypt
 
 db = SQLAlchemy()
-mail = Mail()
-bcrypt = Bcrypt()
\ No newline at end of file
+mail = Mail()
\ No newline at end of file
@@ -0,0 +1,88 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import bcrypt as _bcrypt
+
+# Children start from a clean interpreter, so the pool can be created after
+# the app's background threads are running (forking those can deadlock)
+POOL_START_METHOD = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+
+# Module-level so the process pool can pickle them
+def _hash(password, rounds):
+    return _bcrypt.hashpw(password, _bcrypt.gensalt(rounds)).decode('utf-8')
+
+def _check(hashed, password):
+    try:
+        return _bcrypt.checkpw(password, hashed)
+    except ValueError:
+        # Not a bcrypt hash at all (e.g. a legacy plaintext value)
+        return False
+
+class PasswordHasher:
+    """bcrypt hashing run in a bounded process pool so it doesn't pin request threads.
+
+    Hashes are compatible with the ones Flask-Bcrypt produced before. With
+    PASSWORD_HASH_WORKERS = 0 work runs inline. The pool is created on the
+    first hash in each process, so `import app`, CLI commands and gunicorn
+    --preload masters never start one, and a preloaded worker builds its own
+    instead of using the master's. A pool broken by a dead worker is replaced.
+    """
+
+    def __init__(self):
+        self.rounds = 12
+        self.workers = 0
+        self._pool = None
+        self._pool_pid = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.rounds = app.config.get('BCRYPT_LOG_ROUNDS', 12)
+        self.workers = app.config.get('PASSWORD_HASH_WORKERS', 0)
+
+    def _executor(self):
+        pid = os.getpid()
+        if self._pool is None or self._pool_pid != pid:
+            with self._lock:
+                if self._pool is None or self._pool_pid != pid:
+                    self._pool = ProcessPoolExecutor(
+                        max_workers=self.workers,
+                        mp_context=multiprocessing.get_context(POOL_START_METHOD)
+                    )
+                    self._pool_pid = pid
+        return self._pool
+
+    def _discard(self, pool):
+        with self._lock:
+            if self._pool is pool:
+                self._pool = None
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def _run(self, fn, *args):
+        if not self.workers:
+            return fn(*args)
+        pool = self._executor()
+        try:
+            return pool.submit(fn, *args).result()
+        except BrokenProcessPool:
+            # A worker died (OOM kill, crash); start a fresh pool and retry once
+            self._discard(pool)
+            return self._executor().submit(fn, *args).result()
+
+    def hash(self, password):
+        return self._run(_hash, password.encode('utf-8'), self.rounds)
+
+    def check(self, hashed, password):
+        if not hashed or password is None:
+            return False
+        return self._run(_check, hashed.encode('utf-8'), password.encode('utf-8'))
+
+    def needs_rehash(self, hashed):
+        # bcrypt hashes look like $2b$<cost>$<salt+digest>
+        try:
+            return int(hashed.split('$')[2]) != self.rounds
+        except (IndexError, ValueError):
+            return True
+
+passwords = PasswordHasher()
@@ -0,0 +1,204 @@
+import atexit
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+from sqlalchemy import insert
+from extension import db
+from model import Message
+from events import publish_consultation_event
+
+WRITE_MODES = ('sync', 'group', 'async')
+
+class PendingMessage:
+    """One queued chat message; done is set once its batch has committed (or failed)."""
+
+    __slots__ = ('consultation_id', 'sender_id', 'content', 'timestamp', 'id', 'error', 'done')
+
+    def __init__(self, consultation_id, sender_id, content):
+        self.consultation_id = consultation_id
+        self.sender_id = sender_id
+        self.content = content
+        self.timestamp = datetime.now(timezone.utc)
+        self.id = None
+        self.error = None
+        self.done = threading.Event()
+
+    def row(self):
+        return {
+            "consultation_id": self.consultation_id,
+            "sender_id": self.sender_id,
+            "content": self.content,
+            "timestamp": self.timestamp
+        }
+
+    def event(self):
+        return {
+            "id": self.id,
+            "sender_id": self.sender_id,
+            "content": self.content,
+            "timestamp": self.timestamp.strftime('%H:%M')
+        }
+
+def write_message(consultation_id, sender_id, content):
+    """Inserts and commits a single message in the caller's session (the 'sync' path)."""
+    msg = PendingMessage(consultation_id, sender_id, content)
+    new_msg = Message(**msg.row())
+    db.session.add(new_msg)
+    db.session.commit()
+    msg.id = new_msg.id
+    publish_consultation_event(consultation_id, "message", message=msg.event())
+    return msg
+
+class MessageWriter:
+    """Write-behind buffer for chat messages.
+
+    Sends are appended to an in-memory queue; one worker thread turns
+    whatever has accumulated over MESSAGE_FLUSH_INTERVAL_MS (up to
+    MESSAGE_BATCH_SIZE rows) into a single multi-row INSERT and one commit,
+    so a burst of messages costs one fsync instead of one each. Events are
+    only published after the commit, so clients never see a message that
+    isn't stored. In 'group' mode the sender waits for that commit; in
+    'async' mode it doesn't, and whatever is still buffered when the
+    process dies is lost.
+    """
+
+    def __init__(self):
+        self.app = None
+        self.mode = 'sync'
+        self.flush_interval = 0.005
+        self.batch_size = 200
+        self.timeout = 5.0
+        self._cond = threading.Condition()
+        self._queue = deque()
+        self._thread = None
+        self._stopping = False
+        self.messages = 0
+        self.batches = 0
+        self.failed = 0
+
+    def init_app(self, app):
+        self.app = app
+        self.mode = app.config.get('MESSAGE_WRITE_MODE', 'sync')
+        if self.mode not in WRITE_MODES:
+            raise ValueError(f"MESSAGE_WRITE_MODE must be one of {WRITE_MODES}, got {self.mode!r}")
+        self.flush_interval = app.config.get('MESSAGE_FLUSH_INTERVAL_MS', 5) / 1000
+        self.batch_size = app.config.get('MESSAGE_BATCH_SIZE', 200)
+        self.timeout = app.config.get('MESSAGE_WRITE_TIMEOUT', 5)
+        if self.mode == 'sync' or self._thread is not None:
+            return
+
+        self._thread = threading.Thread(target=self._run, name='message-writer', daemon=True)
+        self._thread.start()
+        # Give buffered messages a chance to reach the database on a clean shutdown
+        atexit.register(self.close)
+
+    @property
+    def buffered(self):
+        return self.mode != 'sync'
+
+    def submit(self, consultation_id, sender_id, content):
+        """Queues a message. Returns the PendingMessage, already committed in 'group' mode.
+
+        If a 'group' write hasn't committed within MESSAGE_WRITE_TIMEOUT it is
+        taken back out of the queue and TimeoutError raised, so a retry can't
+        store it twice. A message the worker has already picked up can't be
+        withdrawn; it is returned uncommitted (id None) and lands shortly.
+        The database error that sank its batch is raised as is.
+        """
+        msg = PendingMessage(consultation_id, sender_id, content)
+        with self._cond:
+            self._queue.append(msg)
+            self._cond.notify()
+
+        if self.mode == 'group':
+            if not msg.done.wait(self.timeout):
+                with self._cond:
+                    try:
+                        self._queue.remove(msg)
+                    except ValueError:
+                        return msg
+                raise TimeoutError("Message write timed out")
+            if msg.error is not None:
+                raise msg.error
+        return msg
+
+    def _take_batch(self):
+        with self._cond:
+            while not self._queue and not self._stopping:
+                self._cond.wait()
+            if not self._queue:
+                return []
+            # Let a burst accumulate, but don't hold a full batch back
+            deadline = time.monotonic() + self.flush_interval
+            while len(self._queue) < self.batch_size and not self._stopping:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            return [self._queue.popleft() for _ in range(min(self.batch_size, len(self._queue)))]
+
+    def _run(self):
+        while True:
+            batch = self._take_batch()
+            if not batch:
+                return
+            with self.app.app_context():
+                try:
+                    self.flush(batch)
+                finally:
+                    db.session.remove()
+
+    def flush(self, batch):
+        """Writes a batch with one INSERT ... RETURNING and one commit, then publishes it."""
+        try:
+            ids = db.session.execute(
+                insert(Message).returning(Message.id, sort_by_parameter_order=True),
+                [msg.row() for msg in batch]
+            ).scalars().all()
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            if len(batch) == 1:
+                self._fail(batch[0], e)
+                return
+            # One bad row (e.g. a consultation deleted meanwhile) shouldn't sink the rest
+            print(f"Message batch of {len(batch)} failed, retrying one by one: {e}")
+            for msg in batch:
+                self.flush([msg])
+            return
+
+        self.messages += len(batch)
+        self.batches += 1
+        for msg, msg_id in zip(batch, ids):
+            msg.id = msg_id
+            msg.done.set()
+            publish_consultation_event(msg.consultation_id, "message", message=msg.event())
+
+    def _fail(self, msg, error):
+        self.failed += 1
+        msg.error = error
+        msg.done.set()
+        print(f"Dropping message for consultation {msg.consultation_id}: {error}")
+
+    def close(self):
+        """Stops the worker once the queue is empty."""
+        if self._thread is None:
+            return
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        self._thread.join(self.timeout)
+        self._thread = None
+
+    def snapshot(self):
+        return {
+            "mode": self.mode,
+            "buffered": len(self._queue),
+            "written": self.messages,
+            "batches": self.batches,
+            "avg_batch": round(self.messages / self.batches, 2) if self.batches else 0.0,
+            "failed": self.failed
+        }
+
+message_writer = MessageWriter()
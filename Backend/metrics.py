@@ -0,0 +1,300 @@
+import hmac
+import random
+import threading
+import time
+from collections import deque, defaultdict
+from flask import Response, abort, g, has_request_context, request
+from sqlalchemy import event
+from extension import db
+
+# How many recent samples the percentile figures are computed over
+SAMPLE_WINDOW = 1000
+SLOW_QUERY_LOG_SIZE = 50
+# Upper bounds (seconds) of the request latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+LOCAL_ADDRS = ('127.0.0.1', '::1')
+# Set by reverse proxies; behind one every peer address is the proxy's own
+FORWARDING_HEADERS = ('X-Forwarded-For', 'X-Real-IP', 'Forwarded')
+
+def percentile(samples, pct):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+class DbMetrics:
+    """Connection-pool and statement timing for the app's SQLAlchemy engine.
+
+    Checkout latency is measured around engine.raw_connection(), which is
+    where a request blocks when the pool is exhausted. Statements slower than
+    SLOW_QUERY_MS are printed and kept in a short ring buffer.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.slow_query_ms = 200
+        self.engine = None
+        self._reset()
+
+    def _reset(self):
+        self.checkouts = 0
+        self.checked_out = 0
+        self.connects = 0
+        self.invalidated = 0
+        self.checkout_total = 0.0
+        self.checkout_max = 0.0
+        self._checkout_samples = deque(maxlen=SAMPLE_WINDOW)
+        self.statements = 0
+        self.statement_total = 0.0
+        self._statement_samples = deque(maxlen=SAMPLE_WINDOW)
+        self.slow_queries = deque(maxlen=SLOW_QUERY_LOG_SIZE)
+
+    def init_app(self, app):
+        self.slow_query_ms = app.config.get('SLOW_QUERY_MS', 200)
+        with app.app_context():
+            engine = db.engine
+        if self.engine is engine:
+            return
+        self.engine = engine
+
+        raw_connection = engine.raw_connection
+        def timed_raw_connection():
+            start = time.perf_counter()
+            try:
+                return raw_connection()
+            finally:
+                self.record_checkout_wait(time.perf_counter() - start)
+        engine.raw_connection = timed_raw_connection
+
+        event.listen(engine, 'connect', self._on_connect)
+        event.listen(engine, 'checkout', self._on_checkout)
+        event.listen(engine, 'checkin', self._on_checkin)
+        event.listen(engine, 'invalidate', self._on_invalidate)
+        event.listen(engine, 'before_cursor_execute', self._before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', self._after_cursor_execute)
+
+    def record_checkout_wait(self, seconds):
+        with self._lock:
+            self.checkout_total += seconds
+            self.checkout_max = max(self.checkout_max, seconds)
+            self._checkout_samples.append(seconds)
+
+    def _on_connect(self, dbapi_conn, record):
+        with self._lock:
+            self.connects += 1
+
+    def _on_checkout(self, dbapi_conn, record, proxy):
+        with self._lock:
+            self.checkouts += 1
+            self.checked_out += 1
+
+    def _on_checkin(self, dbapi_conn, record):
+        with self._lock:
+            self.checked_out = max(0, self.checked_out - 1)
+
+    def _on_invalidate(self, dbapi_conn, record, exception):
+        with self._lock:
+            self.invalidated += 1
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        # Kept on the per-statement context: a statement that raises never reaches
+        # after_cursor_execute, and its start time is dropped along with the context
+        context._metrics_start = time.perf_counter()
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - context._metrics_start
+        with self._lock:
+            self.statements += 1
+            self.statement_total += elapsed
+            self._statement_samples.append(elapsed)
+
+        if elapsed * 1000 >= self.slow_query_ms:
+            text = " ".join(statement.split())[:500]
+            print(f"Slow query ({elapsed * 1000:.1f} ms): {text}")
+            with self._lock:
+                self.slow_queries.append({
+                    "at": time.strftime('%Y-%m-%dT%H:%M:%S'),
+                    "ms": round(elapsed * 1000, 2),
+                    "statement": text
+                })
+
+    def pool_status(self):
+        pool = self.engine.pool if self.engine is not None else None
+        status = {"class": type(pool).__name__ if pool else None}
+        # QueuePool reports these; SingletonThreadPool/NullPool (e.g. SQLite) don't
+        for name in ('size', 'checkedin', 'overflow', 'checkedout'):
+            fn = getattr(pool, name, None)
+            if callable(fn):
+                status[name] = fn()
+        return status
+
+    def snapshot(self):
+        with self._lock:
+            checkouts = list(self._checkout_samples)
+            statements = list(self._statement_samples)
+            return {
+                "pool": self.pool_status(),
+                "connections": {
+                    "opened": self.connects,
+                    "invalidated": self.invalidated,
+                    "in_use": self.checked_out
+                },
+                "checkout": {
+                    "count": self.checkouts,
+                    "avg_ms": round(self.checkout_total / self.checkouts * 1000, 3) if self.checkouts else 0.0,
+                    "p95_ms": round(percentile(checkouts, 95) * 1000, 3),
+                    "max_ms": round(self.checkout_max * 1000, 3)
+                },
+                "statements": {
+                    "count": self.statements,
+                    "avg_ms": round(self.statement_total / self.statements * 1000, 3) if self.statements else 0.0,
+                    "p95_ms": round(percentile(statements, 95) * 1000, 3),
+                    "slow_threshold_ms": self.slow_query_ms
+                },
+                "slow_queries": list(self.slow_queries)
+            }
+
+db_metrics = DbMetrics()
+
+class RouteStats:
+    def __init__(self):
+        self.buckets = [0] * len(LATENCY_BUCKETS)
+        self.count = 0
+        self.latency_sum = 0.0
+        self.sql_count = 0
+        self.db_time = 0.0
+        self.statuses = defaultdict(int)
+
+class RequestProfiler:
+    """Opt-in per-route latency histograms plus SQL count and DB time per request.
+
+    Enabled with PROFILING_ENABLED; PROFILING_SAMPLE_RATE (0..1) limits how
+    many requests are measured so it can stay on in production. Results are
+    served in Prometheus text format at /metrics. With METRICS_TOKEN set the
+    scraper must send it as a bearer token; otherwise only direct local
+    clients get through, and anything relayed by a proxy is refused.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.enabled = False
+        self.sample_rate = 1.0
+        self.token = None
+        self.routes = defaultdict(RouteStats)
+
+    def init_app(self, app):
+        self.enabled = app.config.get('PROFILING_ENABLED', False)
+        self.sample_rate = app.config.get('PROFILING_SAMPLE_RATE', 1.0)
+        self.token = app.config.get('METRICS_TOKEN')
+        if not self.enabled:
+            return
+
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.add_url_rule('/metrics', 'metrics', self.metrics_view)
+
+        with app.app_context():
+            engine = db.engine
+        event.listen(engine, 'before_cursor_execute', self._before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', self._after_cursor_execute)
+
+    def _before_request(self):
+        if self.sample_rate >= 1.0 or random.random() < self.sample_rate:
+            g._profile = {"start": time.perf_counter(), "sql": 0, "db": 0.0}
+
+    def _after_request(self, response):
+        profile = g.pop('_profile', None)
+        if profile is None or request.endpoint == 'metrics':
+            return response
+
+        elapsed = time.perf_counter() - profile["start"]
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        with self._lock:
+            stats = self.routes[(route, request.method)]
+            stats.count += 1
+            stats.latency_sum += elapsed
+            stats.sql_count += profile["sql"]
+            stats.db_time += profile["db"]
+            stats.statuses[response.status_code] += 1
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if elapsed <= bound:
+                    stats.buckets[i] += 1
+                    break
+        return response
+
+    def _current(self):
+        return g.get('_profile') if has_request_context() else None
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        profile = self._current()
+        if profile is not None:
+            profile["query_start"] = time.perf_counter()
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        profile = self._current()
+        if profile is not None and "query_start" in profile:
+            profile["sql"] += 1
+            profile["db"] += time.perf_counter() - profile.pop("query_start")
+
+    def allowed(self):
+        if self.token:
+            sent = request.headers.get('Authorization', '')
+            return hmac.compare_digest(sent.encode(), f"Bearer {self.token}".encode())
+        # The proxy connects from localhost, so its requests would all look local
+        if any(header in request.headers for header in FORWARDING_HEADERS):
+            return False
+        return request.remote_addr in LOCAL_ADDRS
+
+    def metrics_view(self):
+        if not self.allowed():
+            abort(404)
+        return Response(self.render(), mimetype='text/plain; version=0.0.4')
+
+    def render(self):
+        lines = [
+            "# HELP http_request_duration_seconds Request latency by route.",
+            "# TYPE http_request_duration_seconds histogram",
+        ]
+        with self._lock:
+            routes = sorted(self.routes.items())
+            for (route, method), stats in routes:
+                labels = f'route="{route}",method="{method}"'
+                cumulative = 0
+                for bound, n in zip(LATENCY_BUCKETS, stats.buckets):
+                    cumulative += n
+                    lines.append(f'http_request_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+                lines.append(f'http_request_duration_seconds_bucket{{{labels},le="+Inf"}} {stats.count}')
+                lines.append(f'http_request_duration_seconds_sum{{{labels}}} {stats.latency_sum:.6f}')
+                lines.append(f'http_request_duration_seconds_count{{{labels}}} {stats.count}')
+
+            lines += ["# HELP http_requests_total Sampled requests by route and status.",
+                      "# TYPE http_requests_total counter"]
+            for (route, method), stats in routes:
+                for status, n in sorted(stats.statuses.items()):
+                    lines.append(f'http_requests_total{{route="{route}",method="{method}",status="{status}"}} {n}')
+
+            lines += ["# HELP http_request_sql_statements_total SQL statements issued while handling sampled requests.",
+                      "# TYPE http_request_sql_statements_total counter"]
+            for (route, method), stats in routes:
+                lines.append(f'http_request_sql_statements_total{{route="{route}",method="{method}"}} {stats.sql_count}')
+
+            lines += ["# HELP http_request_db_seconds_total Time spent in SQL while handling sampled requests.",
+                      "# TYPE http_request_db_seconds_total counter"]
+            for (route, method), stats in routes:
+                lines.append(f'http_request_db_seconds_total{{route="{route}",method="{method}"}} {stats.db_time:.6f}')
+
+        pool = db_metrics.snapshot()
+        lines += [
+            "# HELP profiler_sample_rate Fraction of requests measured.",
+            "# TYPE profiler_sample_rate gauge",
+            f"profiler_sample_rate {self.sample_rate}",
+            "# HELP db_connections_in_use Pooled connections currently checked out.",
+            "# TYPE db_connections_in_use gauge",
+            f"db_connections_in_use {pool['connections']['in_use']}",
+            "# HELP db_pool_checkout_seconds_max Longest wait for a pooled connection.",
+            "# TYPE db_pool_checkout_seconds_max gauge",
+            f"db_pool_checkout_seconds_max {pool['checkout']['max_ms'] / 1000}",
+        ]
+        return "\n".join(lines) + "\n"
+
+request_profiler = RequestProfiler()
@@ -0,0 +1,125 @@
+from sqlalchemy import inspect, text
+from extension import db
+from model import TRIAGE_ANSWER_COLUMNS, TRIAGE_ANSWER_BITS, normalize_specialty
+from dispatch import DEFAULT_PRIORITY
+
+# Pre-packing SOAP columns; their text is now generated from the answers on read
+LEGACY_SOAP_COLUMNS = ('soap_s', 'soap_o', 'soap_a', 'soap_p')
+# Indexes an earlier schema declared that no query could use
+RETIRED_INDEXES = ('ix_doctor_profiles_online_specialization', 'ix_doctor_profiles_specialty_key')
+
+def table_columns(table):
+    return {col['name'] for col in inspect(db.engine).get_columns(table)}
+
+def add_column_if_missing(conn, table, name, ddl):
+    if name not in table_columns(table):
+        conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {name} {ddl}"))
+        print(f"Migration: added {table}.{name}")
+
+def migrate_triage_answer_masks():
+    """Backfills answered_mask/value_mask from the old per-answer triage columns.
+
+    Safe to run on every start: rows that already carry a mask are skipped and
+    the legacy columns are left untouched until drop_legacy_triage_columns().
+    """
+    with db.engine.begin() as conn:
+        add_column_if_missing(conn, 'triage_sessions', 'answered_mask', "SMALLINT NOT NULL DEFAULT 0")
+        add_column_if_missing(conn, 'triage_sessions', 'value_mask', "SMALLINT NOT NULL DEFAULT 0")
+
+        legacy = [c for c in TRIAGE_ANSWER_COLUMNS if c in table_columns('triage_sessions')]
+        if not legacy:
+            return
+
+        answered = " + ".join(f"(CASE WHEN {c} IS NOT NULL THEN {TRIAGE_ANSWER_BITS[c]} ELSE 0 END)" for c in legacy)
+        values = " + ".join(f"(CASE WHEN {c} = 1 THEN {TRIAGE_ANSWER_BITS[c]} ELSE 0 END)" for c in legacy)
+        has_legacy = " OR ".join(f"{c} IS NOT NULL" for c in legacy)
+        result = conn.execute(text(
+            f"UPDATE triage_sessions SET answered_mask = {answered}, value_mask = {values} "
+            f"WHERE answered_mask = 0 AND ({has_legacy})"
+        ))
+        if result.rowcount:
+            print(f"Migration: packed answers for {result.rowcount} triage sessions")
+
+def migrate_doctor_license_columns():
+    with db.engine.begin() as conn:
+        add_column_if_missing(conn, 'doctor_profiles', 'license_thumb', "VARCHAR(255)")
+        add_column_if_missing(conn, 'doctor_profiles', 'license_status', "VARCHAR(10)")
+        add_column_if_missing(conn, 'doctor_profiles', 'license_attempts', "SMALLINT")
+
+def migrate_doctor_specialty_key():
+    """Adds and backfills doctor_profiles.specialty_key for rows written before it existed."""
+    with db.engine.begin() as conn:
+        add_column_if_missing(conn, 'doctor_profiles', 'specialty_key', "VARCHAR(100)")
+        rows = conn.execute(text(
+            "SELECT id, area_of_specialization FROM doctor_profiles WHERE specialty_key IS NULL"
+        )).all()
+        if rows:
+            conn.execute(
+                text("UPDATE doctor_profiles SET specialty_key = :key WHERE id = :id"),
+                [{"id": row.id, "key": normalize_specialty(row.area_of_specialization)} for row in rows]
+            )
+            print(f"Migration: normalized specialty for {len(rows)} doctors")
+
+def migrate_consultation_queue_columns():
+    """Columns for the dispatch queue; doctor_id becomes optional for queued requests."""
+    with db.engine.begin() as conn:
+        add_column_if_missing(conn, 'consultations', 'specialty_key', "VARCHAR(100)")
+        add_column_if_missing(conn, 'consultations', 'priority', "SMALLINT")
+        # The dispatcher matches specialty_key exactly and sorts on priority, so neither may be NULL
+        conn.execute(text(
+            "UPDATE consultations SET specialty_key = COALESCE(specialty_key, ''), "
+            "priority = COALESCE(priority, :priority) "
+            "WHERE status = 'queued' AND (specialty_key IS NULL OR priority IS NULL)"
+        ), {"priority": DEFAULT_PRIORITY})
+
+        doctor_col = next(c for c in inspect(conn).get_columns('consultations') if c['name'] == 'doctor_id')
+        if doctor_col['nullable']:
+            return
+        if conn.dialect.name == 'sqlite':
+            # SQLite can't relax NOT NULL in place; recreate the dev database instead
+            print("Migration: consultations.doctor_id is NOT NULL; recreate the SQLite database to use the queue")
+            return
+        conn.execute(text("ALTER TABLE consultations ALTER COLUMN doctor_id DROP NOT NULL"))
+        print("Migration: consultations.doctor_id is now nullable")
+
+def ensure_indexes():
+    """Creates any index declared on the models that an existing table is missing.
+
+    create_all only builds indexes along with new tables, so older databases
+    pick up indexes added later through here. Each index gets its own
+    transaction so one that can't be built (e.g. a unique index over rows
+    that already clash) doesn't block the rest.
+    """
+    for table in db.metadata.sorted_tables:
+        existing = {ix['name'] for ix in inspect(db.engine).get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name in existing:
+                continue
+            try:
+                with db.engine.begin() as conn:
+                    index.create(conn)
+                print(f"Migration: created index {index.name}")
+            except Exception as e:
+                print(f"Migration: could not create index {index.name}: {e}")
+
+def drop_retired_indexes():
+    with db.engine.begin() as conn:
+        for name in RETIRED_INDEXES:
+            conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
+
+def drop_legacy_triage_columns():
+    """Run once the packed masks have been verified; not part of the automatic start-up path."""
+    with db.engine.begin() as conn:
+        existing = table_columns('triage_sessions')
+        for name in TRIAGE_ANSWER_COLUMNS + LEGACY_SOAP_COLUMNS:
+            if name in existing:
+                conn.execute(text(f"ALTER TABLE triage_sessions DROP COLUMN {name}"))
+                print(f"Migration: dropped triage_sessions.{name}")
+
+def run_migrations():
+    migrate_triage_answer_masks()
+    migrate_doctor_license_columns()
+    migrate_doctor_specialty_key()
+    migrate_consultation_queue_columns()
+    drop_retired_indexes()
+    ensure_indexes()
@@ -1,8 +1,56 @@
 from extension import db
 from datetime import datetime
+from sqlalchemy import case
+from sqlalchemy.ext.hybrid import hybrid_property
+from sqlalchemy.orm import validates
+
+# Triage answers are binary, so they are packed into two small integers:
+# answered_mask says which questions have an answer, value_mask holds the
+# yes(1)/no(0) bit for each. Bit order matches triage_rules.ANSWER_KEYS.
+TRIAGE_ANSWER_COLUMNS = (
+    'v1_accident', 'v2_walking', 'v3_lateral', 'v3_medial',
+    'v4_midfoot', 'v4_navicular', 'v5_swelling', 'v6_stability'
+)
+TRIAGE_ANSWER_BITS = {name: 1 << i for i, name in enumerate(TRIAGE_ANSWER_COLUMNS)}
+
+def answer_property(name):
+    """Exposes one packed answer bit as the nullable 0/1 column it used to be."""
+    bit = TRIAGE_ANSWER_BITS[name]
+
+    def fget(self):
+        if not (self.answered_mask or 0) & bit:
+            return None
+        return 1 if (self.value_mask or 0) & bit else 0
+
+    def fset(self, value):
+        answered, values = self.answered_mask or 0, self.value_mask or 0
+        if value is None:
+            answered &= ~bit
+            values &= ~bit
+        else:
+            answered |= bit
+            values = values | bit if int(value) else values & ~bit
+        self.answered_mask, self.value_mask = answered, values
+
+    def expr(cls):
+        return case(
+            (cls.answered_mask.op('&')(bit) == 0, None),
+            (cls.value_mask.op('&')(bit) != 0, 1),
+            else_=0
+        )
+
+    return hybrid_property(fget, fset, expr=expr)
+
+def normalize_specialty(value):
+    """Lower-cased, single-spaced form of a specialization used for lookups."""
+    return " ".join((value or "").lower().split())
 
 class Account(db.Model):
     __tablename__ = 'accounts'
+    __table_args__ = (
+        # Admin doctor lists and dashboard counts filter on these together
+        db.Index('ix_accounts_role_is_verified', 'role', 'is_verified'),
+    )
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     email = db.Column(db.String(120), nullable=False, unique=True)
     password = db.Column(db.String(255), nullable=False)
@@ -26,44 +74,101 @@ class User(db.Model):
 
 class Doctor(db.Model):
     __tablename__ = 'doctor_profiles'
+    __table_args__ = (
+        # Partial: only the (few) online doctors, in the id order the roster and
+        # dispatcher read them in. Specialty matching stays in Python / LIKE, so
+        # no index on the specialty columns would be used.
+        db.Index('ix_doctor_profiles_online_id', 'id',
+                 postgresql_where=db.text('is_available_online'),
+                 sqlite_where=db.text('is_available_online = 1')),
+    )
     id = db.Column(db.Integer, primary_key=True)
     acc_id = db.Column(db.Integer, db.ForeignKey('accounts.id', ondelete='CASCADE'), unique=True, nullable=False)
     full_name = db.Column(db.String(100), nullable=False)
     phone_number = db.Column(db.String(20), nullable=False, unique=True)
     area_of_specialization = db.Column(db.String(100), nullable=False)
+    # normalize_specialty(area_of_specialization), kept in step by the validator below
+    specialty_key = db.Column(db.String(100), nullable=True)
     license_no = db.Column(db.String(100), nullable=False, unique=True)
     dob = db.Column(db.Date, nullable=False)
     license_img = db.Column(db.String(255))
+    license_thumb = db.Column(db.String(255), nullable=True)
+    license_status = db.Column(db.String(10), nullable=True) # pending, uploaded, failed
+    license_attempts = db.Column(db.SmallInteger, default=0, nullable=True)
     bio_summary = db.Column(db.Text, nullable=True) 
     is_available_online = db.Column(db.Boolean, default=False)
     hospital_name = db.Column(db.String(150), nullable=True)
     triage_sessions=db.relationship('TriageSession',backref='doctor',lazy=True)
 
+    @validates('area_of_specialization')
+    def _sync_specialty_key(self, key, value):
+        self.specialty_key = normalize_specialty(value)
+        return value
+
 class TriageSession(db.Model):
     __tablename__ = 'triage_sessions'
+    __table_args__ = (
+        # Keyset pagination and flag filtering for the admin history list
+        db.Index('ix_triage_sessions_created_at_id', 'created_at', 'id'),
+        db.Index('ix_triage_sessions_final_flag_created_at', 'final_flag', 'created_at'),
+        # Chat's open-session lookup and the patient's own history
+        db.Index('ix_triage_sessions_user_id_final_flag', 'user_id', 'final_flag'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user_profiles.id', ondelete='CASCADE'), nullable=False)
     doctor_id=db.Column(db.Integer,db.ForeignKey('doctor_profiles.id',ondelete='CASCADE'),nullable=True)
 
     v0_age = db.Column(db.Float, nullable=True) 
-    v1_accident = db.Column(db.Integer, nullable=True) 
-    v2_walking = db.Column(db.Integer, nullable=True)
-    v3_lateral = db.Column(db.Integer, nullable=True)
-    v3_medial = db.Column(db.Integer, nullable=True)   
-    v4_midfoot = db.Column(db.Integer, nullable=True)
-    v4_navicular = db.Column(db.Integer, nullable=True) 
-    v5_swelling = db.Column(db.Integer, nullable=True)  
-    v6_stability = db.Column(db.Integer, nullable=True) 
+    answered_mask = db.Column(db.SmallInteger, nullable=False, default=0)
+    value_mask = db.Column(db.SmallInteger, nullable=False, default=0)
     final_flag = db.Column(db.String(10), nullable=True) 
-    soap_s = db.Column(db.Text, nullable=True)
-    soap_o = db.Column(db.Text, nullable=True)
-    soap_a = db.Column(db.Text, nullable=True)
-    soap_p = db.Column(db.Text, nullable=True)
 
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    v1_accident = answer_property('v1_accident')
+    v2_walking = answer_property('v2_walking')
+    v3_lateral = answer_property('v3_lateral')
+    v3_medial = answer_property('v3_medial')
+    v4_midfoot = answer_property('v4_midfoot')
+    v4_navicular = answer_property('v4_navicular')
+    v5_swelling = answer_property('v5_swelling')
+    v6_stability = answer_property('v6_stability')
+
+    @property
+    def soap_note(self):
+        """SOAP text is fully determined by the answers, flag and age, so it is built on read."""
+        # triage_rules imports this module, so it can only be imported here
+        from triage_rules import soap_from_mask, RECOMMENDATIONS
+        if self.final_flag not in RECOMMENDATIONS:
+            return None
+        age = float(self.v0_age) if self.v0_age is not None else 'Unknown'
+        return soap_from_mask(self.value_mask or 0, self.final_flag, age)
+
+    @property
+    def soap_s(self):
+        note = self.soap_note
+        return note['subjective'] if note else None
+
+    @property
+    def soap_o(self):
+        note = self.soap_note
+        return note['objective'] if note else None
+
+    @property
+    def soap_a(self):
+        note = self.soap_note
+        return note['assessment'] if note else None
+
+    @property
+    def soap_p(self):
+        note = self.soap_note
+        return note['plan'] if note else None
+
 class Otp(db.Model):
     __tablename__ = 'otps'
+    __table_args__ = (
+        db.Index('ix_otps_email_used', 'email', 'used'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     email = db.Column(db.String(120), nullable=False)
     otp = db.Column(db.String(6), nullable=False)
@@ -75,13 +180,31 @@ class Otp(db.Model):
 
 class Consultation(db.Model):
     __tablename__ = 'consultations'
+    __table_args__ = (
+        db.Index('ix_consultations_doctor_id_status', 'doctor_id', 'status'),
+        # Duplicate-request check and the unified history join
+        db.Index('ix_consultations_triage_id_status', 'triage_id', 'status'),
+        # At most one open (queued or pending) request per triage session, enforced by the DB
+        db.Index('uq_consultations_open_triage', 'triage_id', unique=True,
+                 postgresql_where=db.text("status IN ('queued', 'pending')"),
+                 sqlite_where=db.text("status IN ('queued', 'pending')")),
+        db.Index('ix_consultations_patient_id', 'patient_id'),
+        # The dispatch queue: head of a specialty's queue and a request's position in it
+        db.Index('ix_consultations_queued', 'specialty_key', 'priority', 'created_at', 'id',
+                 postgresql_where=db.text("status = 'queued'"),
+                 sqlite_where=db.text("status = 'queued'")),
+    )
     id = db.Column(db.Integer, primary_key=True)
     
     patient_id = db.Column(db.Integer, db.ForeignKey('user_profiles.id', ondelete='CASCADE'), nullable=False)
-    doctor_id = db.Column(db.Integer, db.ForeignKey('doctor_profiles.id', ondelete='CASCADE'), nullable=False)
+    # Empty while a request waits in the dispatch queue
+    doctor_id = db.Column(db.Integer, db.ForeignKey('doctor_profiles.id', ondelete='CASCADE'), nullable=True)
     triage_id = db.Column(db.Integer, db.ForeignKey('triage_sessions.id', ondelete='CASCADE'), nullable=False)
     
-    status = db.Column(db.String(20), default='pending', nullable=False) # pending, accepted, rejected, completed
+    status = db.Column(db.String(20), default='pending', nullable=False) # queued, pending, accepted, rejected, completed
+    # Always set for queued requests: normalized specialty wanted ('' = any) and triage priority (1 = most urgent)
+    specialty_key = db.Column(db.String(100), nullable=True)
+    priority = db.Column(db.SmallInteger, nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     
@@ -94,6 +217,9 @@ class Consultation(db.Model):
 
 class Message(db.Model):
     __tablename__ = 'messages' 
+    __table_args__ = (
+        db.Index('ix_messages_consultation_id_id', 'consultation_id', 'id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     
    
@@ -105,4 +231,22 @@ class Message(db.Model):
     content = db.Column(db.Text, nullable=False)
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
     
-    sender = db.relationship('Account', backref='messages')
\ No newline at end of file
+    sender = db.relationship('Account', backref='messages')
+
+class MailOutbox(db.Model):
+    """Durable queue of outgoing mail, written in the same transaction as the change that triggers it."""
+    __tablename__ = 'mail_outbox'
+    __table_args__ = (
+        db.Index('ix_mail_outbox_status_next_attempt_at', 'status', 'next_attempt_at'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    recipient = db.Column(db.String(120), nullable=False)
+    subject = db.Column(db.String(255), nullable=False)
+    body = db.Column(db.Text, nullable=False)
+    status = db.Column(db.String(10), default='pending', nullable=False) # pending, sending, sent, failed
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+    next_attempt_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    claimed_by = db.Column(db.String(32), nullable=True)
+    last_error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime, nullable=True)
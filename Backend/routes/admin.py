@@ -1,24 +1,92 @@
-from flask import Blueprint, request, jsonify, session
+import json
+from datetime import datetime, timedelta
+from flask import Blueprint, request, jsonify, session, Response, stream_with_context
+from sqlalchemy import and_, or_, case, cast, func, literal, union_all, select, String
 from extension import db
-from model import Account, Doctor,TriageSession,User
-from utilities import send_mail, gen_pass
+from hashing import passwords
+from model import Account, Doctor,TriageSession,User, Consultation
+from utilities import send_mail, gen_pass, dashboard_cache, mail_metrics
+from metrics import db_metrics
+from message_writer import message_writer
 
 admin = Blueprint('admin', __name__, url_prefix='/admin')
 
+HISTORY_PAGE_SIZE = 50
+HISTORY_MAX_PAGE_SIZE = 200
+# Rows fetched per round trip while streaming a full export
+EXPORT_CHUNK_SIZE = 500
+# How far back the dashboard's triage-by-day breakdown reaches
+STATS_TRIAGE_DAYS = 30
+
 @admin.route('/dashboard_stats', methods=['GET'])
 def dashboard_stats():
     if session.get('role') != 'Admin':
         return jsonify({"error": "Unauthorized"}), 403
     
-    pending = Account.query.filter_by(role='Doctor', is_verified=False).count()
-    verified = Account.query.filter_by(role='Doctor', is_verified=True).count()
-    patients = Account.query.filter_by(role='User').count()
+    return jsonify(dashboard_cache.get_or_set('stats', compute_dashboard_stats)), 200
+
+def compute_dashboard_stats():
+    """All dashboard counts in one round trip: a UNION ALL of three GROUP BYs."""
+    since = datetime.utcnow() - timedelta(days=STATS_TRIAGE_DAYS)
+
+    accounts = select(
+        literal('account').label('kind'),
+        Account.role.label('k1'),
+        case((Account.is_verified == True, 'verified'), else_='pending').label('k2'),
+        func.count().label('n')
+    ).group_by(Account.role, Account.is_verified)
+
+    triage_day = cast(func.date(TriageSession.created_at), String)
+    triages = select(
+        literal('triage'),
+        triage_day,
+        TriageSession.final_flag,
+        func.count()
+    ).where(
+        TriageSession.created_at >= since,
+        TriageSession.final_flag.isnot(None)
+    ).group_by(triage_day, TriageSession.final_flag)
+
+    consultations = select(
+        literal('consultation'),
+        Consultation.status,
+        literal(''),
+        func.count()
+    ).group_by(Consultation.status)
+
+    account_counts, triage_by_day, consult_counts = {}, {}, {}
+    for kind, k1, k2, n in db.session.execute(union_all(accounts, triages, consultations)):
+        if kind == 'account':
+            role = account_counts.setdefault(k1, {"verified": 0, "pending": 0})
+            role[k2] += n
+        elif kind == 'triage':
+            triage_by_day.setdefault(k1, {})[k2] = n
+        else:
+            consult_counts[k1] = n
+
+    doctors = account_counts.get('Doctor', {"verified": 0, "pending": 0})
+    patients = account_counts.get('User', {"verified": 0, "pending": 0})
+
+    return {
+        "pending_verifications": doctors["pending"],
+        "total_doctors": doctors["verified"],
+        "total_patients": patients["verified"] + patients["pending"],
+        "accounts": account_counts,
+        "triage_by_day": triage_by_day,
+        "consultations": consult_counts
+    }
 
-    return jsonify({
-        "pending_verifications": pending,
-        "total_doctors": verified,
-        "total_patients": patients
-    }), 200
+@admin.route('/mail_metrics', methods=['GET'])
+def get_mail_metrics():
+    if session.get('role') != 'Admin':
+        return jsonify({"error": "Unauthorized"}), 403
+    return jsonify(mail_metrics.snapshot()), 200
+
+@admin.route('/db_metrics', methods=['GET'])
+def get_db_metrics():
+    if session.get('role') != 'Admin':
+        return jsonify({"error": "Unauthorized"}), 403
+    return jsonify({**db_metrics.snapshot(), "message_writer": message_writer.snapshot()}), 200
 
 @admin.route('/get_doctors/<string:status>', methods=['GET'])
 def get_doctors(status):
@@ -37,7 +105,10 @@ def get_doctors(status):
         "licenseNo": doc.license_no if doc else "N/A",
         "specialization": doc.area_of_specialization if doc else "N/A", 
         "phone": doc.phone_number if doc else "N/A",
-        "licenseImage": doc.license_img if doc else None
+        # The list shows the thumbnail; the full scan is only fetched on demand
+        "licenseImage": (doc.license_thumb or doc.license_img) if doc else None,
+        "licenseFull": doc.license_img if doc else None,
+        "licenseStatus": doc.license_status if doc else None
     } for acc, doc in docs]), 200
 
 @admin.route('/handle_request/<int:acc_id>', methods=['POST'])
@@ -55,10 +126,11 @@ def handle_request(acc_id):
     try:
         if action == 'verify':
             temp_pwd = gen_pass()
-            account.password = temp_pwd
+            account.password = passwords.hash(temp_pwd)
             account.is_verified = True
             send_mail(account.email, temp_pwd)
             db.session.commit()
+            dashboard_cache.invalidate()
             return jsonify({"message": "Doctor Verified"}), 200
         
         elif action == 'reject':
@@ -71,6 +143,7 @@ def handle_request(acc_id):
             Doctor.query.filter_by(acc_id=acc_id).delete()
             db.session.delete(account)
             db.session.commit()
+            dashboard_cache.invalidate()
             return jsonify({"message": "Application rejected"}), 200
             
     except Exception as e:
@@ -80,23 +153,93 @@ def handle_request(acc_id):
 # Include history and detail routes here as previously optimized
 @admin.route('/triage-history', methods=['GET'])
 def get_triage_history():
-    """Fetches the list for the sidebar."""
+    """Fetches the list for the sidebar, newest first, one keyset page at a time.
+
+    Query params: limit, cursor (from the previous page's next_cursor), flag,
+    from/to (YYYY-MM-DD, inclusive) and export=1 to stream every matching row.
+    """
     try:
-        # Join ensures we only get sessions that have an associated user profile
-        results = db.session.query(TriageSession, User).join(
-            User, TriageSession.user_id == User.id
-        ).all()
-        
-        return jsonify([{
-            "session_id": s.id,
-            "patient_name": u.full_name,
-            "acc_id": u.acc_id,
-            "flag": s.final_flag,
-            "timestamp": s.created_at.isoformat()
-        } for s, u in results]), 200
+        query = history_query(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    try:
+        if request.args.get('export') == '1':
+            return Response(stream_with_context(stream_history(query)), mimetype='application/json')
+
+        limit = min(max(request.args.get('limit', HISTORY_PAGE_SIZE, type=int), 1), HISTORY_MAX_PAGE_SIZE)
+        cursor = request.args.get('cursor')
+        if cursor:
+            created_at, session_id = parse_history_cursor(cursor)
+            query = query.filter(or_(
+                TriageSession.created_at < created_at,
+                and_(TriageSession.created_at == created_at, TriageSession.id < session_id)
+            ))
+
+        # One extra row tells us whether another page exists
+        rows = query.limit(limit + 1).all()
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+
+        return jsonify({
+            "items": [history_item(row) for row in rows],
+            "next_cursor": f"{rows[-1].created_at.isoformat()}|{rows[-1].id}" if has_more else None
+        }), 200
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+def history_query(args):
+    # Column projection only; the join keeps sessions that have a user profile
+    query = db.session.query(
+        TriageSession.id,
+        TriageSession.created_at,
+        TriageSession.final_flag,
+        User.full_name,
+        User.acc_id
+    ).join(User, TriageSession.user_id == User.id)
+
+    flag = args.get('flag')
+    if flag:
+        query = query.filter(TriageSession.final_flag == flag.upper())
+
+    date_from, date_to = args.get('from'), args.get('to')
+    try:
+        if date_from:
+            query = query.filter(TriageSession.created_at >= datetime.strptime(date_from, '%Y-%m-%d'))
+        if date_to:
+            query = query.filter(TriageSession.created_at < datetime.strptime(date_to, '%Y-%m-%d') + timedelta(days=1))
+    except ValueError:
+        raise ValueError("Dates must be YYYY-MM-DD")
+
+    return query.order_by(TriageSession.created_at.desc(), TriageSession.id.desc())
+
+def parse_history_cursor(cursor):
+    try:
+        created_at, session_id = cursor.rsplit('|', 1)
+        return datetime.fromisoformat(created_at), int(session_id)
+    except ValueError:
+        raise ValueError("Invalid cursor")
+
+def history_item(row):
+    return {
+        "session_id": row.id,
+        "patient_name": row.full_name,
+        "acc_id": row.acc_id,
+        "flag": row.final_flag,
+        "timestamp": row.created_at.isoformat()
+    }
+
+def stream_history(query):
+    # Emits a JSON array chunk by chunk so memory stays flat for full exports
+    yield "["
+    first = True
+    for row in query.execution_options(yield_per=EXPORT_CHUNK_SIZE):
+        yield ("" if first else ",") + json.dumps(history_item(row))
+        first = False
+    yield "]"
+
 @admin.route('/triage-detail/<int:session_id>', methods=['GET'])
 def get_triage_detail(session_id):
     """Fetches the full report for the right pane."""
@@ -2,18 +2,15 @@ import os
 import random
 from datetime import datetime, timedelta, timezone
 from flask import Blueprint, request, jsonify, session
-from supabase import create_client
-from extension import db,bcrypt
+from extension import db
+from hashing import passwords
 from model import Account, Doctor, User, Otp
-from utilities import send_mail, gen_pass
+from utilities import send_mail, gen_pass, dashboard_cache
+from storage import license_uploader
 from werkzeug.utils import secure_filename
 
 auth = Blueprint('auth', __name__)
 
-SUPABASE_URL = os.getenv("SUPABASE_URL")
-SUPABASE_KEY = os.getenv("SUPABASE_KEY")
-supabase_client = create_client(SUPABASE_URL, SUPABASE_KEY)
-
 @auth.route('/sign_up', methods=['POST'])
 def sign_up():
     data = request.form if request.form else request.get_json()
@@ -23,13 +20,14 @@ def sign_up():
     if not email or not role:
         return jsonify({"error": "Missing email or role"}), 400
 
+    license_file = None
     try:
         if Account.query.filter_by(email=email).first():
             return jsonify({"error": "Email already registered"}), 409
 
         temp_password = gen_pass()
         
-        hashed_temp_password = bcrypt.generate_password_hash(temp_password).decode('utf-8')
+        hashed_temp_password = passwords.hash(temp_password)
 
         new_account = Account(
             email=email,
@@ -51,18 +49,9 @@ def sign_up():
             except ValueError:
                 return jsonify({"error": "Invalid DOB format"}), 400
                 
-            public_url = None
-            if 'License_Img' in request.files:
-                file = request.files['License_Img']
-                if file.filename != '':
-                    ext = secure_filename(file.filename).rsplit('.', 1)[-1]
-                    storage_path = f"doc_{new_account.id}.{ext}"
-                    supabase_client.storage.from_('licenses').upload(
-                        path=storage_path,
-                        file=file.read(),
-                        file_options={"content-type": file.content_type}
-                    )
-                    public_url = supabase_client.storage.from_('licenses').get_public_url(storage_path)
+            upload = request.files.get('License_Img')
+            if upload and upload.filename == '':
+                upload = None
 
             profile = Doctor(
                 acc_id=new_account.id,
@@ -71,12 +60,20 @@ def sign_up():
                 area_of_specialization=data.get('Specialization'),
                 phone_number=data.get('Phone_Number'),
                 dob=dob_date, 
-                license_img=public_url,
+                license_img=None,
+                license_status='pending' if upload else None,
                 hospital_name=data.get('hospital_name'),
                 bio_summary=data.get('bio_summary'),
                 is_available_online=False
             )
             db.session.add(profile)
+            db.session.flush()
+            doctor_id = profile.id
+
+            # The scan is spooled to disk here and uploaded after commit by a worker
+            if upload:
+                ext = secure_filename(upload.filename).rsplit('.', 1)[-1]
+                license_file = (license_uploader.spool(upload, doctor_id, ext), ext, upload.content_type)
 
         elif role == 'User':
             dob_str = data.get('dob') or data.get('DOB')
@@ -93,10 +90,17 @@ def sign_up():
             send_mail(email, f"Your temporary password is: {temp_password}")
 
         db.session.commit()
+        dashboard_cache.invalidate()
+
+        if role == 'Doctor' and license_file:
+            license_uploader.submit(doctor_id, *license_file)
+
         return jsonify({"message": "Registration successful"}), 201
 
     except Exception as e:
         db.session.rollback()
+        if license_file:
+            os.remove(license_file[0])
         return jsonify({"error": f"Server error: {str(e)}"}), 500
 
 @auth.route('/login', methods=['POST'])
@@ -108,12 +112,17 @@ def login():
     account = Account.query.filter_by(email=email).first()
 
     
-    if not account or not bcrypt.check_password_hash(account.password, password):
+    if not account or not passwords.check(account.password, password):
         return jsonify({"error": "Invalid credentials"}), 401
 
     if not account.is_verified:
         return jsonify({"error": "Account pending verification"}), 403
 
+    # Transparently upgrade hashes made with a different bcrypt cost
+    if passwords.needs_rehash(account.password):
+        account.password = passwords.hash(password)
+        db.session.commit()
+
     session.clear() 
     session['account_id'] = account.id 
     session['role'] = account.role
@@ -143,7 +152,7 @@ def change_password():
     account = Account.query.filter_by(email=email).first()
     if not account: return jsonify({"error": "Account not found"}), 404
 
-    account.password = bcrypt.generate_password_hash(new_pass).decode('utf-8')
+    account.password = passwords.hash(new_pass)
     account.is_temp_password = False 
     db.session.commit()
     
@@ -173,9 +182,9 @@ def forgot_password():
     Otp.query.filter_by(email=email, used=False).update({"used": True})
     new_otp = Otp(email=email, otp=otp_code, expires_at=expiry)
     db.session.add(new_otp)
+    send_mail(email, f"Your reset OTP is: {otp_code}")
     db.session.commit()
 
-    send_mail(email, f"Your reset OTP is: {otp_code}")
     return jsonify({"message": "OTP sent"}), 200
 
 @auth.route("/verify_otp", methods=["POST"])
@@ -1,47 +1,38 @@
-from flask import Blueprint, jsonify, request, session
+from flask import Blueprint, jsonify, request, session, current_app
 from extension import db
-import os
-import datetime
-from model import Doctor, Account, TriageSession, Consultation, User
+from model import Doctor, Account, TriageSession, Consultation, User, normalize_specialty
+from events import publish_consultation_event
+from storage import get_storage, LICENSE_BUCKET
+from sqlalchemy.orm import joinedload
+from utilities import load_profile, doctor_roster_cache
+from dispatch import dispatch_engine
+from consultation_state import accept, reject, complete, TransitionError, TRANSITIONS
 
 doctor = Blueprint('doctor', __name__)
 
-def get_auth_doctor():
-    acc_id = session.get("account_id")
-    if not acc_id:
-        return None
-    return Doctor.query.filter_by(acc_id=acc_id).first()
+def get_auth_doctor(*options):
+    return load_profile(Doctor, session.get("account_id"), *options)
 
 @doctor.route('/profile', methods=['GET'])
 def profile():
-    doc = get_auth_doctor()
+    doc = get_auth_doctor(joinedload(Doctor.account))
     if not doc:
         return jsonify({"error": "Unauthorized"}), 401
 
-    # 1. Pull base configuration from .env
-    supabase_url = os.getenv("SUPABASE_URL")
-    if supabase_url:
-        supabase_url = supabase_url.rstrip('/')
-    
-    bucket_name = "licenses" # Ensure this matches your Supabase bucket name
-    
-    # 2. Fix the URL Nesting Logic
+    # Older rows hold a bare object path, newer ones the full public URL
     raw_path = doc.license_img
     license_url = None
 
     if raw_path:
-        # If the DB already contains 'http://...', use it directly
         if raw_path.startswith('http'):
             license_url = raw_path
         else:
-            # If DB contains 'doc_3.jpeg', construct the URL
-            # Format: https://project.supabase.co/storage/v1/object/public/bucket/file
-            license_url = f"{supabase_url}/storage/v1/object/public/{bucket_name}/{raw_path.lstrip('/')}"
+            license_url = get_storage().public_url(LICENSE_BUCKET, raw_path)
 
-    # 3. Get associated Account info for email
-    acc = Account.query.get(doc.acc_id)
-    
-    # 4. Return the cleaned data
+    # Account was joined in with the doctor, no second lookup needed
+    acc = doc.account
+
+    # Return the cleaned data
     return jsonify({
         "full_name": doc.full_name,
         "available": doc.is_available_online,
@@ -68,10 +59,16 @@ def update_status():
     if 'available' in data:
         doc.is_available_online = data['available']
         db.session.commit() # Update in the database upon toggling
-        
+        doctor_roster_cache.invalidate()
+
+    available = doc.is_available_online
+    if available:
+        # Coming online frees capacity for anyone waiting in the queue
+        dispatch_engine.dispatch()
+
     return jsonify({
         "message": "Status updated",
-        "available": doc.is_available_online
+        "available": available
     }), 200
 @doctor.route('/update', methods=['PUT'])
 def update():
@@ -92,26 +89,51 @@ def update():
 
     try:
         db.session.commit()
-        return jsonify({"message": "Success", "available": doc.is_available_online}), 200
+        available = doc.is_available_online
+        if 'available' in data:
+            doctor_roster_cache.invalidate()
+            if available:
+                dispatch_engine.dispatch()
+        return jsonify({"message": "Success", "available": available}), 200
     except Exception:
         db.session.rollback()
         return jsonify({"error": "Database Error"}), 500
 
 @doctor.route('/available', methods=['GET'])
 def get_available_doctors():
-    query = Doctor.query.filter_by(is_available_online=True)
-    specialty = request.args.get('specialty')
+    # Served from the cached online roster; the DB is only read after a miss
+    doctors = doctor_roster_cache.get_or_set('online', load_online_roster)
+
+    specialty = normalize_specialty(request.args.get('specialty'))
     if specialty:
-        query = query.filter(Doctor.area_of_specialization.ilike(f"%{specialty}%"))
-    
-    doctors = query.all()
-    return jsonify([{
-        "id": d.id,
-        "name": d.full_name,
-        "specialization": d.area_of_specialization,
-        "hospital": d.hospital_name,
-        "photo": getattr(d, 'profile_photo', None) 
-    } for d in doctors]), 200
+        doctors = [d for key, d in doctors if specialty in key]
+    else:
+        doctors = [d for _, d in doctors]
+
+    # Optional paging; the body stays a plain array and the total goes in a header
+    page = request.args.get('page', type=int)
+    if not page or page < 1:
+        return jsonify(doctors), 200
+
+    per_page = min(max(request.args.get('per_page', 20, type=int), 1), current_app.config['DOCTOR_PAGE_MAX'])
+    start = (page - 1) * per_page
+    response = jsonify(doctors[start:start + per_page])
+    response.headers['X-Total-Count'] = str(len(doctors))
+    return response, 200
+
+def load_online_roster():
+    """(specialty_key, payload) for every online doctor, in a stable order."""
+    rows = db.session.query(
+        Doctor.id, Doctor.full_name, Doctor.area_of_specialization, Doctor.specialty_key, Doctor.hospital_name
+    ).filter(Doctor.is_available_online == True).order_by(Doctor.id).all()
+
+    return [(row.specialty_key or normalize_specialty(row.area_of_specialization), {
+        "id": row.id,
+        "name": row.full_name,
+        "specialization": row.area_of_specialization,
+        "hospital": row.hospital_name,
+        "photo": None
+    }) for row in rows]
 
 @doctor.route('/consultations', methods=['GET'])
 def get_all_consultations():
@@ -161,18 +183,26 @@ def respond(consult_id):
 
     data = request.json
     status = data.get('status') # Frontend MUST send 'accepted' or 'rejected'
+    if status not in ('accepted', 'rejected'):
+        return jsonify({"error": "Status must be 'accepted' or 'rejected'"}), 400
 
-    consult = Consultation.query.filter_by(id=consult_id, doctor_id=doc.id).first()
-    if not consult:
-        return jsonify({"error": "Consultation not found"}), 404
-
-    consult.status = status
     try:
-        db.session.commit()
-        return jsonify({"message": f"Consultation {status}", "status": status}), 200
+        if status == 'accepted':
+            # The dashboard flow leaves availability to the doctor's own toggle
+            accept(consult_id, doc.id, mark_busy=False)
+        else:
+            reject(consult_id, doc.id)
+    except TransitionError as e:
+        if e.missing:
+            return jsonify({"error": "Consultation not found"}), 404
+        return jsonify({"error": f"Consultation is already {e.current}", "status": e.current}), 409
     except Exception:
         db.session.rollback()
         return jsonify({"error": "Update failed"}), 500
+
+    publish_consultation_event(consult_id, "status", status=status)
+    dispatch_engine.dispatch()
+    return jsonify({"message": f"Consultation {status}", "status": status}), 200
     
 @doctor.route('/consultation/<int:consult_id>/end', methods=['POST'])
 def end_consultation(consult_id):
@@ -187,35 +217,42 @@ def end_consultation(consult_id):
     if not summary or len(summary) < 15:
         return jsonify({"error": "Clinical summary must be at least 15 characters long."}), 400
         
-    consult = Consultation.query.filter_by(id=consult_id, doctor_id=doc.id).first()
-    if not consult:
-        return jsonify({"error": "Consultation record not found"}), 404
-
     try:
         # Update session status and persist the clinical record
-        consult.status = 'completed'
-        consult.clinical_summary = summary
-        # Assuming your model has an ended_at column, or just use DB transaction time
-        db.session.commit()
-        return jsonify({"message": "Consultation finalized and archived"}), 200
+        complete(consult_id, doc.id, summary)
+    except TransitionError as e:
+        if e.missing:
+            return jsonify({"error": "Consultation record not found"}), 404
+        return jsonify({"error": f"Consultation is already {e.current}", "status": e.current}), 409
     except Exception as e:
         db.session.rollback()
         return jsonify({"error": "Failed to finalize session"}), 500
+
+    publish_consultation_event(consult_id, "status", status='completed')
+    dispatch_engine.dispatch()
+    return jsonify({"message": "Consultation finalized and archived"}), 200
     
 
 @doctor.route('/consultation/<int:consult_id>/finalize', methods=['POST'])
 def finalize_consultation(consult_id):
     doc = get_auth_doctor()
+    if not doc:
+        return jsonify({"error": "Unauthorized"}), 401
     data = request.json
-    
-    consult = Consultation.query.filter_by(id=consult_id, doctor_id=doc.id).first()
-    if not consult:
-        return jsonify({"error": "Record not found"}), 404
-
-    # Only update the summary - leave the Triage SOAP alone as requested
-    consult.clinical_summary = data.get('summary')
-    consult.status = 'completed'
-    consult.ended_at = datetime.datetime.utcnow()
-    
-    db.session.commit()
+
+    # Only update the summary - leave the Triage SOAP alone as requested.
+    # An already completed consultation may have its summary rewritten.
+    try:
+        complete(consult_id, doc.id, data.get('summary'),
+                 expected=TRANSITIONS['completed'] + ('completed',))
+    except TransitionError as e:
+        if e.missing:
+            return jsonify({"error": "Record not found"}), 404
+        return jsonify({"error": f"Consultation is {e.current}", "status": e.current}), 409
+    except Exception:
+        db.session.rollback()
+        return jsonify({"error": "Failed to save summary"}), 500
+
+    publish_consultation_event(consult_id, "status", status='completed')
+    dispatch_engine.dispatch()
     return jsonify({"message": "Summary saved successfully"}), 200
\ No newline at end of file
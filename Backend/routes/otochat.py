@@ -1,10 +1,22 @@
-from flask import Blueprint, request, jsonify, session
+import json
+from flask import Blueprint, request, jsonify, session, Response, stream_with_context
 from extension import db
 from model import Message, Consultation, Doctor, Account # Fixed import name consistency
-from datetime import datetime, timezone
+from events import get_broker, consultation_channel, publish_consultation_event
+from utilities import load_profile, doctor_roster_cache, hhmm
+from dispatch import dispatch_engine
+from consultation_state import accept, reject, complete, TransitionError, cached_status
+from message_writer import message_writer, write_message
 
 otochat = Blueprint('otochat', __name__)
 
+# Seconds between SSE keep-alive comments so proxies don't drop idle streams
+STREAM_HEARTBEAT = 15
+MESSAGE_PAGE_SIZE = 50
+MESSAGE_MAX_PAGE_SIZE = 200
+# Rows fetched per round trip while streaming a full export
+EXPORT_CHUNK_SIZE = 500
+
 # Helper to check session consistently
 def get_current_acc_id():
     # Use 'account_id' everywhere. DO NOT mix with 'user_id'.
@@ -16,22 +28,58 @@ def get_messages(cons_id):
     if not acc_id:
         return jsonify({"error": "Unauthorized"}), 401
 
-    cons = Consultation.query.get(cons_id)
-    if not cons:
+    status = db.session.query(Consultation.status).filter_by(id=cons_id).scalar()
+    if status is None:
         return jsonify({"error": "Consultation not found"}), 404
 
-    messages = Message.query.filter_by(consultation_id=cons_id).order_by(Message.timestamp.asc()).all()
-    
+    # Only the columns the client shows, with the time already formatted by the DB
+    query = db.session.query(
+        Message.id, Message.sender_id, Message.content, hhmm(Message.timestamp).label('timestamp')
+    ).filter(Message.consultation_id == cons_id)
+
+    if request.args.get('export') == '1':
+        return Response(stream_with_context(stream_messages(query.order_by(Message.id.asc()))),
+                        mimetype='application/json')
+
+    limit = min(max(request.args.get('limit', MESSAGE_PAGE_SIZE, type=int), 1), MESSAGE_MAX_PAGE_SIZE)
+    after_id = request.args.get('after_id', type=int)
+    before_id = request.args.get('before_id', type=int)
+
+    if after_id is not None:
+        # Incremental mode: clients pass back the last id they have seen and only
+        # receive rows written after it (served by ix_messages_consultation_id_id)
+        rows = query.filter(Message.id > after_id).order_by(Message.id.asc()).limit(limit + 1).all()
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+    else:
+        # Newest page first; before_id walks back through older pages
+        if before_id is not None:
+            query = query.filter(Message.id < before_id)
+        rows = query.order_by(Message.id.desc()).limit(limit + 1).all()
+        has_more = len(rows) > limit
+        rows = rows[:limit][::-1]
+
     return jsonify({
-        "status": cons.status,
-        "messages": [{
-            "id": m.id,
-            "sender_id": m.sender_id, 
-            "content": m.content,
-            "timestamp": m.timestamp.strftime('%H:%M')
-        } for m in messages]
+        "status": status,
+        "last_id": rows[-1].id if rows else after_id,
+        # Pass as before_id to load the page preceding this one
+        "before_id": rows[0].id if rows else before_id,
+        "has_more": has_more,
+        "messages": [message_item(row) for row in rows]
     }), 200
 
+def message_item(row):
+    return {"id": row.id, "sender_id": row.sender_id, "content": row.content, "timestamp": row.timestamp}
+
+def stream_messages(query):
+    # Emits a JSON array chunk by chunk so memory stays flat however long the chat is
+    yield "["
+    first = True
+    for row in query.execution_options(yield_per=EXPORT_CHUNK_SIZE):
+        yield ("" if first else ",") + json.dumps(message_item(row))
+        first = False
+    yield "]"
+
 @otochat.route('/send', methods=['POST'])
 def send_message():
     acc_id = get_current_acc_id()
@@ -39,24 +87,67 @@ def send_message():
         return jsonify({"error": "Unauthorized"}), 401
 
     data = request.json
-    cons_id = data.get('consultationId')
     content = data.get('content')
+    try:
+        # Clients may send the id as a string; the status cache is keyed by int
+        cons_id = int(data.get('consultationId'))
+    except (TypeError, ValueError):
+        return jsonify({"error": "Invalid consultation ID"}), 400
 
     # Security Check: Prevent sending messages to closed chats
-    cons = Consultation.query.get(cons_id)
-    if not cons or cons.status == 'completed':
+    status = cached_status(cons_id)
+    if not status or status == 'completed':
         return jsonify({"error": "Consultation is closed"}), 403
 
-    new_msg = Message(
-        consultation_id=cons_id,
-        sender_id=acc_id,
-        content=content,
-        timestamp=datetime.now(timezone.utc)
-    )
-    
-    db.session.add(new_msg)
-    db.session.commit()
-    return jsonify({"success": True}), 201
+    if not message_writer.buffered:
+        msg = write_message(cons_id, acc_id, content)
+        return jsonify({"success": True, "id": msg.id}), 201
+
+    try:
+        msg = message_writer.submit(cons_id, acc_id, content)
+    except Exception:
+        return jsonify({"error": "Message could not be saved"}), 503
+
+    if msg.id is None:
+        # Write-behind: stored shortly, and pushed to the chat once it is
+        return jsonify({"success": True, "queued": True}), 202
+    return jsonify({"success": True, "id": msg.id}), 201
+
+@otochat.route('/stream/<int:cons_id>', methods=['GET'])
+def stream(cons_id):
+    """Server-Sent Events feed of new messages and status changes for a consultation."""
+    acc_id = get_current_acc_id()
+    if not acc_id:
+        return jsonify({"error": "Unauthorized"}), 401
+
+    cons = Consultation.query.get(cons_id)
+    if not cons:
+        return jsonify({"error": "Consultation not found"}), 404
+
+    # Subscribe before responding so nothing published in between is lost
+    sub = get_broker().subscribe(consultation_channel(cons_id))
+    initial_status = cons.status
+
+    def generate():
+        try:
+            yield f"event: status\ndata: {json.dumps({'status': initial_status})}\n\n"
+            if initial_status == 'completed':
+                return
+            while True:
+                event = sub.get(timeout=STREAM_HEARTBEAT)
+                if event is None:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+                if event['type'] == 'status' and event.get('status') == 'completed':
+                    return
+        finally:
+            sub.close()
+
+    return Response(stream_with_context(generate()), mimetype='text/event-stream', headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"
+    })
 
 @otochat.route('/end', methods=['POST'])
 def end_session():
@@ -71,29 +162,26 @@ def end_session():
     if not cons_id or not summary:
         return jsonify({"error": "Missing consultation ID or summary"}), 400
 
-    cons = Consultation.query.get(cons_id)
-    if not cons:
-        return jsonify({"error": "Consultation not found"}), 404
-
     # Ensure only the assigned doctor can end it
-    doctor_profile = Doctor.query.filter_by(acc_id=acc_id).first()
-    if not doctor_profile or cons.doctor_id != doctor_profile.id:
+    doctor_profile = load_profile(Doctor, acc_id)
+    if not doctor_profile:
         return jsonify({"error": "Only the assigned doctor can end this session"}), 403
 
     try:
-        cons.status = 'completed'
-        cons.clinical_summary = summary
-        cons.ended_at = datetime.now(timezone.utc)
-
-        # Restoration of availability
-        doctor_profile.is_available_online = True
-        
-        db.session.commit()
-        return jsonify({"message": "Consultation finalized successfully"}), 200
-
+        # Completes and restores the doctor's availability in one transaction
+        complete(int(cons_id), doctor_profile.id, summary, release_doctor=True)
+    except TransitionError as e:
+        if e.missing:
+            return jsonify({"error": "Only the assigned doctor can end this session"}), 403
+        return jsonify({"error": f"Consultation is already {e.current}", "status": e.current}), 409
     except Exception as e:
         db.session.rollback()
         return jsonify({"error": str(e)}), 500
+
+    doctor_roster_cache.invalidate()
+    publish_consultation_event(int(cons_id), "status", status='completed')
+    dispatch_engine.dispatch()
+    return jsonify({"message": "Consultation finalized successfully"}), 200
     
 @otochat.route('/respond/<int:cons_id>', methods=['POST'])
 def respond_to_consultation(cons_id):
@@ -103,32 +191,34 @@ def respond_to_consultation(cons_id):
 
     data = request.json
     action = data.get('action') # 'accepted' or 'rejected'
-
-    cons = Consultation.query.get(cons_id)
-    if not cons:
-        return jsonify({"error": "Consultation not found"}), 404
+    if action not in ('accepted', 'rejected'):
+        return jsonify({"error": "Invalid action"}), 400
 
     # Fetch doctor profile to verify ownership and update availability
-    doctor = Doctor.query.filter_by(acc_id=acc_id).first()
+    doctor = load_profile(Doctor, acc_id)
     if not doctor:
         return jsonify({"error": "Doctor profile not found"}), 403
 
-    if action == 'accepted':
-        cons.status = 'accepted'
-        cons.doctor_id = doctor.id
-        # Doctor is now busy with a patient
-        doctor.is_available_online = False 
-    elif action == 'rejected':
-        cons.status = 'rejected'
-    else:
-        return jsonify({"error": "Invalid action"}), 400
-
     try:
-        db.session.commit()
-        return jsonify({
-            "status": cons.status,
-            "message": f"Consultation {action} successfully"
-        }), 200
+        if action == 'accepted':
+            # Also marks the doctor busy with this patient
+            accept(cons_id, doctor.id)
+        else:
+            reject(cons_id, doctor.id)
+    except TransitionError as e:
+        if e.missing:
+            return jsonify({"error": "Consultation not found"}), 404
+        return jsonify({"error": f"Consultation is already {e.current}", "status": e.current}), 409
     except Exception as e:
         db.session.rollback()
-        return jsonify({"error": str(e)}), 500
\ No newline at end of file
+        return jsonify({"error": str(e)}), 500
+
+    if action == 'accepted':
+        doctor_roster_cache.invalidate()
+    publish_consultation_event(cons_id, "status", status=action)
+    if action == 'rejected':
+        dispatch_engine.dispatch()
+    return jsonify({
+        "status": action,
+        "message": f"Consultation {action} successfully"
+    }), 200
\ No newline at end of file
@@ -1,90 +1,106 @@
+from functools import lru_cache
+from itertools import chain
+from operator import itemgetter
 from flask import Blueprint, jsonify, request
+from triage_rules import ANSWER_KEYS, ANSWER_BITS, RECOMMENDATIONS, soap_from_mask
 
 triage = Blueprint('triage', __name__)
 
-RECOMMENDATIONS = {
-    "RED": {
-        "title": "EMERGENCY CARE REQUIRED",
-        "text": "High risk of fracture detected. Inability to bear weight or bone tenderness requires immediate X-ray imaging at a Trauma Center.",
-        "emergency_numbers": [
-            {"label": "Ambulance (Nepal Red Cross)", "number": "102"},
-            {"label": "Police", "number": "100"}
-        ],
-        "cta_label": "Call Ambulance (102)",
-        "show_doctors": False,
-        "color_code": "#EE3E3E",
-        "priority": 1
-    },
-    "YELLOW": {
-        "title": "Urgent Specialist Review",
-        "text": "Symptoms suggest potential ligamentous injury or age-related risks (Pediatric/Geriatric). Specialist review recommended.",
-        "cta_label": "Book Orthopedist",
-        "show_doctors": True,
-        "color_code": "#E7E13B",
-        "priority": 2
-    },
-    "GREEN": {
-        "title": "Home Care (RICE)",
-        "text": "Low risk of fracture. Follow Rest, Ice, Compression, and Elevation (RICE) for 48 hours.",
-        "cta_label": "View Recovery Guide",
-        "show_doctors": False,
-        "color_code": "#10B981",
-        "priority": 3
-    }
-}
+OTTAWA_RED_KEYS = ['V1_ACCIDENT', 'V2_WALKING', 'V3_LATERAL', 'V3_MEDIAL', 'V4_MIDFOOT', 'V4_NAVICULAR']
+YELLOW_KEYS = ['V5_SWELLING', 'V6_STABILITY']
 
-def gen_soap_note(res, flag):
-    age = res.get('V0_AGE', 'Unknown')
-    is_high_impact = str(res.get('V1_ACCIDENT')) == '1'
-    trauma = "High-Impact" if is_high_impact else "Low-impact"
-    
-    s = f"Subjective: Patient ({age}y) reports {trauma} injury to the ankle."
-
-    findings = []
-    mapping = {
-        'V2_WALKING': "Inability to bear weight",
-        'V3_LATERAL': "Lateral Malleolus tenderness",
-        'V3_MEDIAL': "Medial Malleolus tenderness",
-        'V4_MIDFOOT': "Base of 5th Metatarsal tenderness",
-        'V4_NAVICULAR': "Navicular bone tenderness"
-    }
-    
-    for key, desc in mapping.items():
+RED_MASK = sum(ANSWER_BITS[k] for k in OTTAWA_RED_KEYS)
+YELLOW_MASK = sum(ANSWER_BITS[k] for k in YELLOW_KEYS)
+_answer_row = itemgetter(*ANSWER_KEYS)
+# Answer values for which `v == 1 or v == '1'` is the same test as str(v) == '1'
+PLAIN_ANSWER_TYPES = {int, str, type(None)}
+
+@lru_cache(maxsize=None)
+def _numpy():
+    # numpy is only needed by the batch endpoint; importing it lazily keeps worker start-up cheap
+    import numpy
+    return numpy
+
+# Largest number of response vectors accepted by /evaluate_batch in one call
+MAX_BATCH_SIZE = 10000
+
+def encode_answers(res):
+    mask = 0
+    for key, bit in ANSWER_BITS.items():
         if str(res.get(key)) == '1':
-            findings.append(desc)
-    
-    o = "Objective: Exam Findings: " + (", ".join(findings) if findings else "No focal bone tenderness noted.")
-    a = f"Assessment: {flag} status. Ottawa Ankle Rules {'Positive' if flag == 'RED' else 'Negative/Inconclusive'}."
+            mask |= bit
+    return mask
 
-    if flag == "RED":
-        p = "Plan: Immediate referral to the nearest Trauma Center (Nepal) for radiographic imaging (X-ray)."
-    elif flag == "YELLOW":
-        p = "Plan: Orthopedic specialist consultation for joint stability evaluation and ligamentous assessment."
+def encode_answers_batch(responses):
+    """encode_answers over many responses: the answers become one flat cell array compared in NumPy."""
+    np = _numpy()
+    n, width = len(responses), len(ANSWER_KEYS)
+    try:
+        rows = list(map(_answer_row, responses))
+    except KeyError:
+        # Some responses are partial; missing answers read as None
+        rows = [tuple(map(res.get, ANSWER_KEYS)) for res in responses]
+
+    cells = np.fromiter(chain.from_iterable(rows), dtype=object, count=n * width)
+    if set(map(type, chain.from_iterable(rows))) <= PLAIN_ANSWER_TYPES:
+        positive = (cells == 1) | (cells == '1')
     else:
-        p = "Plan: Home management via RICE protocol. Patient to monitor for increased pain or neurovascular changes."
+        # Bools and floats compare equal to 1 without reading as '1'
+        positive = np.array(list(map(str, cells)), dtype=str) == '1'
 
-    return {"subjective": s, "objective": o, "assessment": a, "plan": p}
+    weights = np.array([ANSWER_BITS[k] for k in ANSWER_KEYS], dtype=np.int64)
+    return positive.reshape(n, width) @ weights
 
-def run_triage_logic(res):
+def gen_soap_note(res, flag):
+    return soap_from_mask(encode_answers(res), flag, res.get('V0_AGE', 'Unknown'))
+
+def parse_age(res):
     try:
-        age = float(res.get('V0_AGE', 30))
+        return float(res.get('V0_AGE', 30))
     except (ValueError, TypeError):
-        age = 30.0
+        return 30.0
 
-   
-    if age < 1.0 or str(res.get('V1_ACCIDENT')) == '1':
-        return 'RED'
-    ottawa_red_keys = ['V2_WALKING', 'V3_LATERAL', 'V3_MEDIAL', 'V4_MIDFOOT', 'V4_NAVICULAR']
-    if any(str(res.get(k)) == '1' for k in ottawa_red_keys):
+def parse_ages_batch(responses):
+    np = _numpy()
+    # None and a missing age both fall back to 30, as in parse_age
+    raw = [30 if (age := res.get('V0_AGE')) is None else age for res in responses]
+    try:
+        ages = np.array(raw, dtype=float)
+    except (TypeError, ValueError):
+        ages = None
+    if ages is None or ages.ndim != 1:
+        # Something other than a number or numeric string (e.g. [5] becomes a row, not a scalar)
+        ages = np.fromiter(map(parse_age, responses), dtype=float, count=len(responses))
+    return ages
+
+def run_triage_logic(res):
+    age = parse_age(res)
+    mask = encode_answers(res)
+
+    if age < 1.0 or mask & RED_MASK:
         return 'RED'
 
-    
-    yellow_keys = ['V5_SWELLING', 'V6_STABILITY']
-    if (age < 18.0 or age > 55.0) or any(str(res.get(k)) == '1' for k in yellow_keys):
+    if (age < 18.0 or age > 55.0) or mask & YELLOW_MASK:
         return "YELLOW"
 
     return "GREEN"
 
+def run_triage_batch(responses, masks=None):
+    """Same rules as run_triage_logic, evaluated over many response dicts at once."""
+    n = len(responses)
+    if n == 0:
+        return []
+
+    np = _numpy()
+    if masks is None:
+        masks = encode_answers_batch(responses)
+    ages = parse_ages_batch(responses)
+
+    red = (ages < 1.0) | ((masks & RED_MASK) != 0)
+    yellow = (ages < 18.0) | (ages > 55.0) | ((masks & YELLOW_MASK) != 0)
+
+    return np.where(red, 'RED', np.where(yellow, 'YELLOW', 'GREEN')).tolist()
+
 @triage.route('/evaluate', methods=['POST'])
 def evaluate():
     responses = request.get_json(silent=True)
@@ -99,4 +115,28 @@ def evaluate():
         "flag": flag,
         "content": RECOMMENDATIONS.get(flag),
         "soap": soap
-    })
\ No newline at end of file
+    })
+
+@triage.route('/evaluate_batch', methods=['POST'])
+def evaluate_batch():
+    payload = request.get_json(silent=True)
+    responses = payload.get('responses') if isinstance(payload, dict) else payload
+
+    if not isinstance(responses, list) or not responses:
+        return jsonify({"status": "error", "message": "No triage data provided"}), 400
+    if len(responses) > MAX_BATCH_SIZE:
+        return jsonify({"status": "error", "message": f"Batch limited to {MAX_BATCH_SIZE} entries"}), 413
+    if not all(isinstance(res, dict) for res in responses):
+        return jsonify({"status": "error", "message": "Each entry must be an object"}), 400
+
+    masks = encode_answers_batch(responses)
+    flags = run_triage_batch(responses, masks)
+
+    return jsonify({
+        "status": "success",
+        "count": len(flags),
+        "results": [
+            {"flag": flag, "soap": soap_from_mask(int(mask), flag, res.get('V0_AGE', 'Unknown'))}
+            for res, mask, flag in zip(responses, masks.tolist(), flags)
+        ]
+    })
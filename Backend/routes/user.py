@@ -1,15 +1,21 @@
+import time
 from flask import Blueprint, jsonify, session, request
-from model import User, Account, TriageSession, Consultation, Doctor
+from model import User, Account, TriageSession, Consultation, Doctor, normalize_specialty
 from extension import db
+from events import get_broker, consultation_channel
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload
+from utilities import load_profile
+from dispatch import dispatch_engine, triage_priority
 
 user = Blueprint('user', __name__)
 
+# Upper bound for ?wait= on the long-poll status endpoint, in seconds
+STATUS_MAX_WAIT = 30
+
 def get_current_user():
     """Internal helper to retrieve the User profile via session."""
-    acc_id = session.get('account_id')
-    if not acc_id:
-        return None
-    return User.query.filter_by(acc_id=acc_id).first()
+    return load_profile(User, session.get('account_id'))
 
 @user.route('/profile', methods=['GET'])
 def get_profile():
@@ -81,11 +87,6 @@ def request_consultation():
     if not patient:
         return jsonify({"error": "User profile not found"}), 404
 
-    # Prevent duplicate pending requests for the same triage session
-    existing = Consultation.query.filter_by(triage_id=trig_id, status='pending').first()
-    if existing:
-        return jsonify({"error": "Request already pending for this session"}), 409
-
     new_request = Consultation(
         patient_id=patient.id,
         doctor_id=doc_id,
@@ -93,25 +94,130 @@ def request_consultation():
         status='pending'
     )
 
+    # Duplicate pending requests for the same triage session are rejected by
+    # the uq_consultations_open_triage index, so two racing clicks can't both land
     try:
         db.session.add(new_request)
         db.session.commit()
         return jsonify({"message": "Request sent", "consultation_id": new_request.id}), 201
+    except IntegrityError:
+        db.session.rollback()
+        if has_open_request(trig_id):
+            return jsonify({"error": "Request already pending for this session"}), 409
+        return jsonify({"error": "Unknown doctor or triage session"}), 400
+    except Exception:
+        db.session.rollback()
+        return jsonify({"error": "Database error"}), 500
+
+def has_open_request(triage_id):
+    return db.session.query(Consultation.id).filter(
+        Consultation.triage_id == triage_id, Consultation.status.in_(('pending', 'queued'))
+    ).first() is not None
+
+@user.route('/consultation/queue', methods=['POST'])
+def queue_consultation():
+    """Asks for the next available doctor instead of picking one; see dispatch.DispatchEngine."""
+    patient = get_current_user()
+    if not patient:
+        return jsonify({"error": "Login required"}), 401
+
+    data = request.json or {}
+    try:
+        trig_id = int(data.get('triage_id'))
+    except (TypeError, ValueError):
+        return jsonify({"error": "Invalid ID format"}), 400
+
+    triage_session = TriageSession.query.filter_by(id=trig_id, user_id=patient.id).first()
+    if not triage_session:
+        return jsonify({"error": "Triage session not found"}), 404
+
+    new_request = Consultation(
+        patient_id=patient.id,
+        triage_id=trig_id,
+        status='queued',
+        specialty_key=normalize_specialty(data.get('specialty')),
+        priority=triage_priority(triage_session.final_flag)
+    )
+
+    try:
+        db.session.add(new_request)
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify({"error": "Request already pending for this session"}), 409
     except Exception:
         db.session.rollback()
         return jsonify({"error": "Database error"}), 500
 
+    cons_id, patient_id = new_request.id, new_request.patient_id
+    dispatch_engine.enqueue(new_request)
+    return jsonify(queue_state(cons_id, patient_id)), 201
+
+@user.route('/consultation/queue/<int:consult_id>', methods=['GET'])
+def get_queue_position(consult_id):
+    patient = get_current_user()
+    if not patient:
+        return jsonify({"error": "Unauthorized"}), 401
+
+    state = queue_state(consult_id, patient.id)
+    if not state:
+        return jsonify({"error": "Consultation not found"}), 404
+    return jsonify(state), 200
+
+def queue_state(consult_id, patient_id):
+    status = db.session.query(Consultation.status)\
+        .filter_by(id=consult_id, patient_id=patient_id).scalar()
+    if status is None:
+        return None
+    return {
+        "consultation_id": consult_id,
+        "status": status,
+        "position": dispatch_engine.position(consult_id) if status == 'queued' else None
+    }
+
 @user.route('/consultation/status/<int:consult_id>', methods=['GET'])
 def get_consult_status(consult_id):
     patient = get_current_user()
     if not patient:
         return jsonify({"error": "Unauthorized"}), 401
 
-    consult = Consultation.query.filter_by(id=consult_id, patient_id=patient.id).first()
-    if not consult:
-        return jsonify({"error": "Consultation not found"}), 404
-        
+    # Long-poll mode: ?wait=<seconds>&known=<status> holds the request until the
+    # status differs from what the client already has, or the wait elapses
+    wait = min(max(request.args.get('wait', 0, type=float), 0), STATUS_MAX_WAIT)
+    known = request.args.get('known')
+
+    # Subscribe before reading so a change landing in between still wakes us
+    sub = get_broker().subscribe(consultation_channel(consult_id)) if wait else None
+    # The doctor is joined in up front; the rollback below would expire patient
+    patient_id = patient.id
+    query = Consultation.query.options(joinedload(Consultation.doctor))\
+        .filter_by(id=consult_id, patient_id=patient_id)
+    try:
+        consult = query.first()
+        if not consult:
+            return jsonify({"error": "Consultation not found"}), 404
+
+        if sub and consult.status == known:
+            # Hand the pooled connection back while we sleep
+            db.session.rollback()
+            if wait_for_status_event(sub, wait):
+                consult = query.first()
+    finally:
+        if sub:
+            sub.close()
+
     return jsonify({
         "status": consult.status,
         "doctor_name": consult.doctor.full_name if consult.doctor else "Doctor"
-    }), 200
\ No newline at end of file
+    }), 200
+
+def wait_for_status_event(sub, timeout):
+    """Blocks until a status event arrives on the subscription. Returns False on timeout."""
+    deadline = time.monotonic() + timeout
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return False
+        event = sub.get(timeout=remaining)
+        if event and event.get('type') == 'status':
+            return True
@@ -0,0 +1,256 @@
+import mimetypes
+import os
+import re
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app
+from sqlalchemy import func
+from extension import db
+from model import Doctor
+
+LICENSE_BUCKET = 'licenses'
+# Longest edge of the stored scan and of the thumbnail the admin list shows
+LICENSE_MAX_EDGE = 2000
+LICENSE_THUMB_EDGE = 320
+# Spooled scans are named after the doctor so a sweep can find them again
+SPOOL_NAME = re.compile(r'^doc_(\d+)\.([\w-]*)$')
+
+class LocalStorage:
+    """Filesystem stand-in for the Supabase bucket, for offline and dev use.
+
+    Files land under Flask's static folder so the dev server serves them as-is.
+    """
+
+    def __init__(self, root, base_url):
+        self.root = root
+        self.base_url = base_url.rstrip('/')
+
+    def upload(self, bucket, path, local_path, content_type=None):
+        dest = os.path.join(self.root, bucket, path)
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        shutil.copyfile(local_path, dest)
+
+    def public_url(self, bucket, path):
+        return f"{self.base_url}/{bucket}/{path.lstrip('/')}"
+
+class SupabaseStorage:
+    """Talks to the Supabase Storage REST API directly.
+
+    Nothing is created until the first upload, and every request shares one
+    keep-alive httpx connection pool, instead of building the full Supabase
+    SDK client at import time.
+    """
+
+    def __init__(self, url, key, max_connections=10):
+        self.url = (url or '').rstrip('/')
+        self.key = key
+        self.max_connections = max_connections
+        self._http = None
+        self._lock = threading.Lock()
+
+    @property
+    def http(self):
+        if self._http is None:
+            with self._lock:
+                if self._http is None:
+                    import httpx
+                    self._http = httpx.Client(
+                        timeout=30.0,
+                        limits=httpx.Limits(max_connections=self.max_connections,
+                                            max_keepalive_connections=self.max_connections),
+                        headers={"Authorization": f"Bearer {self.key}", "apikey": self.key}
+                    )
+        return self._http
+
+    def upload(self, bucket, path, local_path, content_type=None):
+        # httpx streams file objects, so the scan is never held in memory whole
+        with open(local_path, 'rb') as f:
+            response = self.http.post(
+                f"{self.url}/storage/v1/object/{bucket}/{path}",
+                content=f,
+                headers={
+                    "Content-Type": content_type or "application/octet-stream",
+                    "Content-Length": str(os.path.getsize(local_path)),
+                    "x-upsert": "true"
+                }
+            )
+        response.raise_for_status()
+
+    def public_url(self, bucket, path):
+        return f"{self.url}/storage/v1/object/public/{bucket}/{path.lstrip('/')}"
+
+_storage = None
+_storage_lock = threading.Lock()
+
+def create_storage(config):
+    if config.get('STORAGE_BACKEND') == 'local':
+        return LocalStorage(config['LOCAL_STORAGE_DIR'], config['LOCAL_STORAGE_URL'])
+    return SupabaseStorage(os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_KEY"),
+                           config.get('STORAGE_MAX_CONNECTIONS', 10))
+
+def get_storage():
+    """Process-wide storage backend, built from the app config on first use."""
+    global _storage
+    if _storage is None:
+        with _storage_lock:
+            if _storage is None:
+                _storage = create_storage(current_app.config)
+    return _storage
+
+def resize_image(src, dest, max_edge):
+    """Downscales src into dest as JPEG. Returns False when Pillow is missing or the file isn't an image."""
+    try:
+        # Imported here so Pillow stays off the start-up path; it is optional anyway
+        from PIL import Image
+    except ImportError:
+        return False
+    try:
+        with Image.open(src) as img:
+            img.thumbnail((max_edge, max_edge))
+            img.convert('RGB').save(dest, 'JPEG', quality=85, optimize=True)
+        return True
+    except Exception:
+        return False
+
+class LicenseUploader:
+    """Moves license scans to storage off the request thread.
+
+    sign_up spools the upload to LICENSE_SPOOL_DIR and commits the doctor with
+    license_status='pending'; a worker then downscales, uploads and fills in
+    license_img/license_thumb. A failed attempt keeps the spooled file and is
+    retried with backoff, up to LICENSE_MAX_ATTEMPTS, before the row is
+    marked 'failed'. The file is only removed once the row leaves 'pending',
+    so sweep() can retry scans a crash or restart left behind.
+    """
+
+    def __init__(self):
+        self.app = None
+        self._executor = None
+        self.spool_dir = None
+        self.retry_after = 600
+        self.max_attempts = 5
+        self.retry_backoff = 30
+
+    def init_app(self, app):
+        self.app = app
+        self.spool_dir = app.config['LICENSE_SPOOL_DIR']
+        self.retry_after = app.config.get('LICENSE_RETRY_AFTER', 600)
+        self.max_attempts = app.config.get('LICENSE_MAX_ATTEMPTS', 5)
+        self.retry_backoff = app.config.get('LICENSE_RETRY_BACKOFF', 30)
+        self._executor = ThreadPoolExecutor(max_workers=app.config.get('LICENSE_UPLOAD_WORKERS', 2),
+                                            thread_name_prefix='license-upload')
+
+    def spool(self, file, doctor_id, ext):
+        """Streams a werkzeug FileStorage to the spool dir instead of reading it into memory."""
+        os.makedirs(self.spool_dir, exist_ok=True)
+        path = os.path.join(self.spool_dir, f"doc_{doctor_id}.{ext}")
+        with open(path, 'wb') as out:
+            shutil.copyfileobj(file.stream, out, length=64 * 1024)
+        return path
+
+    def submit(self, doctor_id, local_path, ext, content_type):
+        return self._executor.submit(self._process, doctor_id, local_path, ext, content_type)
+
+    def sweep(self):
+        """Retries pending scans untouched for retry_after seconds. Returns (retried, failed).
+
+        A pending doctor with no spooled file can never finish, so it is
+        marked 'failed'; spooled files whose row never committed are removed.
+        """
+        cutoff = time.time() - self.retry_after
+        # Read the rows before listing files: sign_up spools before it commits
+        pending = {row.id for row in db.session.query(Doctor.id).filter_by(license_status='pending')}
+        spooled = {}
+        if os.path.isdir(self.spool_dir):
+            for name in os.listdir(self.spool_dir):
+                match = SPOOL_NAME.match(name)
+                if match:
+                    spooled[int(match.group(1))] = (os.path.join(self.spool_dir, name), match.group(2))
+
+        lost = [doctor_id for doctor_id in pending if doctor_id not in spooled]
+        if lost:
+            Doctor.query.filter(Doctor.id.in_(lost), Doctor.license_status == 'pending')\
+                .update({"license_status": 'failed'}, synchronize_session=False)
+            db.session.commit()
+
+        retried = 0
+        for doctor_id, (path, ext) in spooled.items():
+            try:
+                if os.path.getmtime(path) > cutoff:
+                    # Still in its first attempt, or one started by another sweep
+                    continue
+                if doctor_id in pending:
+                    # Bump the mtime so a concurrent sweep leaves this one alone
+                    os.utime(path)
+                    self._process(doctor_id, path, ext, mimetypes.guess_type(path)[0])
+                    retried += 1
+                else:
+                    os.remove(path)
+            except OSError:
+                # Finished (and cleaned up) by a worker while we were looking
+                pass
+        return retried, len(lost)
+
+    def _process(self, doctor_id, local_path, ext, content_type):
+        # The spooled original stays until the upload lands or the attempts run out
+        cleanup, done = [], False
+        with self.app.app_context():
+            try:
+                storage = get_storage()
+                full_path, thumb_path = local_path + '.full.jpg', local_path + '.thumb.jpg'
+                if resize_image(local_path, full_path, LICENSE_MAX_EDGE):
+                    cleanup.append(full_path)
+                    upload_path, name, mime = full_path, f"doc_{doctor_id}.jpg", 'image/jpeg'
+                else:
+                    upload_path, name, mime = local_path, f"doc_{doctor_id}.{ext}", content_type
+
+                storage.upload(LICENSE_BUCKET, name, upload_path, mime)
+                thumb_url = None
+                if resize_image(local_path, thumb_path, LICENSE_THUMB_EDGE):
+                    cleanup.append(thumb_path)
+                    thumb_name = f"thumbs/doc_{doctor_id}.jpg"
+                    storage.upload(LICENSE_BUCKET, thumb_name, thumb_path, 'image/jpeg')
+                    thumb_url = storage.public_url(LICENSE_BUCKET, thumb_name)
+
+                Doctor.query.filter_by(id=doctor_id).update({
+                    "license_img": storage.public_url(LICENSE_BUCKET, name),
+                    "license_thumb": thumb_url,
+                    "license_status": 'uploaded'
+                })
+                db.session.commit()
+                done = True
+            except Exception as e:
+                db.session.rollback()
+                done = self._record_failure(doctor_id, local_path, ext, content_type, e)
+            finally:
+                db.session.remove()
+                for path in cleanup + ([local_path] if done else []):
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+
+    def _record_failure(self, doctor_id, local_path, ext, content_type, error):
+        """Counts a failed attempt and schedules the next. Returns True once the scan is given up on."""
+        Doctor.query.filter_by(id=doctor_id).update(
+            {"license_attempts": func.coalesce(Doctor.license_attempts, 0) + 1})
+        attempts = db.session.query(Doctor.license_attempts).filter_by(id=doctor_id).scalar() or 0
+        if attempts >= self.max_attempts:
+            Doctor.query.filter_by(id=doctor_id).update({"license_status": 'failed'})
+            db.session.commit()
+            print(f"License upload failed for doctor {doctor_id}, giving up after {attempts} attempts: {error}")
+            return True
+        db.session.commit()
+
+        delay = self.retry_backoff * 2 ** (attempts - 1)
+        print(f"License upload failed for doctor {doctor_id} (attempt {attempts}), retrying in {delay:.0f}s: {error}")
+        # Fresh mtime: sweep() leaves the file to this retry unless the process dies first
+        os.utime(local_path)
+        timer = threading.Timer(delay, self.submit, (doctor_id, local_path, ext, content_type))
+        timer.daemon = True
+        timer.start()
+        return False
+
+license_uploader = LicenseUploader()
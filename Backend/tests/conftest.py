@@ -0,0 +1,137 @@
+import os
+import sys
+import tempfile
+from datetime import date
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+# Config is read at import time, so the environment has to be in place before `import app`.
+# A file (not :memory:) database, so threads in the concurrency tests share it.
+_db_dir = tempfile.mkdtemp(prefix='curamind-tests-')
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(_db_dir, 'test.db')
+os.environ.setdefault('SECRET_KEY', 'test')
+os.environ['MAIL_QUEUE_ENABLED'] = 'False'
+os.environ['BCRYPT_LOG_ROUNDS'] = '4'
+# Hash inline; tests/test_password_hashing.py builds its own pooled hasher
+os.environ['PASSWORD_HASH_WORKERS'] = '0'
+
+
+@pytest.fixture(scope='session')
+def app():
+    import app as appmod
+    appmod.app.config['TESTING'] = True
+    return appmod.app
+
+
+@pytest.fixture
+def database(app):
+    """A freshly created schema per test, with the in-process caches emptied."""
+    import app as appmod
+    from extension import db
+    from utilities import dashboard_cache, doctor_roster_cache
+    from consultation_state import status_cache
+
+    with app.app_context():
+        db.drop_all()
+        appmod.init_db()
+    for cache in (dashboard_cache, doctor_roster_cache, status_cache):
+        cache.invalidate()
+    yield db
+    with app.app_context():
+        db.session.remove()
+
+
+@pytest.fixture
+def client_as(app):
+    """Test client logged in as the given account."""
+    def make(acc_id, role):
+        client = app.test_client()
+        with client.session_transaction() as sess:
+            sess['account_id'] = acc_id
+            sess['role'] = role
+        return client
+    return make
+
+
+@pytest.fixture
+def sql_statements(app, database):
+    """Every SQL statement the engine sends while the test runs, in order."""
+    from sqlalchemy import event
+    with app.app_context():
+        engine = database.engine
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(" ".join(statement.split()))
+
+    event.listen(engine, 'before_cursor_execute', record)
+    yield statements
+    event.remove(engine, 'before_cursor_execute', record)
+
+
+def verbs(statements):
+    return [statement.split(None, 1)[0].upper() for statement in statements]
+
+
+class Seeder:
+    """Inserts the rows most tests start from; every method returns plain ids."""
+
+    def __init__(self, app, db):
+        self.app = app
+        self.db = db
+        self._n = 0
+
+    def _next(self):
+        self._n += 1
+        return self._n
+
+    def patient(self):
+        from model import Account, User
+        n = self._next()
+        with self.app.app_context():
+            acc = Account(email=f'patient{n}@test', password='x', role='User', is_verified=True)
+            self.db.session.add(acc)
+            self.db.session.flush()
+            user = User(acc_id=acc.id, full_name=f'Patient {n}', phone_number=f'100{n}',
+                        address='Street', dob=date(1990, 1, 1))
+            self.db.session.add(user)
+            self.db.session.commit()
+            return acc.id, user.id
+
+    def doctor(self, specialization='Orthopedics', online=True):
+        from model import Account, Doctor
+        n = self._next()
+        with self.app.app_context():
+            acc = Account(email=f'doctor{n}@test', password='x', role='Doctor', is_verified=True)
+            self.db.session.add(acc)
+            self.db.session.flush()
+            doc = Doctor(acc_id=acc.id, full_name=f'Doctor {n}', phone_number=f'200{n}',
+                         area_of_specialization=specialization, license_no=f'LIC{n}',
+                         dob=date(1980, 1, 1), is_available_online=online)
+            self.db.session.add(doc)
+            self.db.session.commit()
+            return acc.id, doc.id
+
+    def triage(self, user_id, flag='YELLOW'):
+        from model import TriageSession
+        with self.app.app_context():
+            session = TriageSession(user_id=user_id, v0_age=30, final_flag=flag)
+            self.db.session.add(session)
+            self.db.session.commit()
+            return session.id
+
+    def consultation(self, user_id, doctor_id, triage_id, status='pending'):
+        from model import Consultation
+        with self.app.app_context():
+            cons = Consultation(patient_id=user_id, doctor_id=doctor_id, triage_id=triage_id, status=status)
+            self.db.session.add(cons)
+            self.db.session.commit()
+            return cons.id
+
+
+@pytest.fixture
+def seed(app, database):
+    return Seeder(app, database)
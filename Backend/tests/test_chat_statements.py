@@ -0,0 +1,32 @@
+from conftest import verbs
+
+
+def chat(client, acc_id, message):
+    response = client.post('/chat/message', json={'acc_id': acc_id, 'message': message})
+    assert response.status_code == 200
+    return response.get_json()
+
+
+def test_steady_turn_is_one_select_and_one_update(app, seed, sql_statements):
+    patient_acc, _ = seed.patient()
+    client = app.test_client()
+    chat(client, patient_acc, 'start_triage')
+
+    sql_statements.clear()
+    reply = chat(client, patient_acc, 'no')
+
+    assert reply['status'] == 'active'
+    assert verbs(sql_statements) == ['SELECT', 'UPDATE']
+
+
+def test_restart_abandons_and_inserts_in_one_transaction(app, seed, sql_statements):
+    patient_acc, _ = seed.patient()
+    client = app.test_client()
+    chat(client, patient_acc, 'start_triage')
+    chat(client, patient_acc, 'no')
+
+    sql_statements.clear()
+    reply = chat(client, patient_acc, 'start_triage')
+
+    assert reply['status'] == 'active'
+    assert verbs(sql_statements) == ['SELECT', 'UPDATE', 'INSERT']
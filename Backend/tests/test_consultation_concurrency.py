@@ -0,0 +1,121 @@
+import threading
+
+from extension import db
+from model import Consultation, Doctor
+
+THREADS = 16
+
+
+def race(n, fn):
+    """Runs fn(i) on n threads released together; returns the results."""
+    start = threading.Barrier(n)
+    results = [None] * n
+
+    def worker(i):
+        start.wait()
+        results[i] = fn(i)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(n)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results
+
+
+def test_concurrent_requests_create_one_consultation(app, seed, client_as):
+    patient_acc, patient_id = seed.patient()
+    _, doctor_id = seed.doctor()
+    triage_id = seed.triage(patient_id)
+
+    codes = race(THREADS, lambda i: client_as(patient_acc, 'User').post(
+        '/user/consultation/request', json={'doctor_id': doctor_id, 'triage_id': triage_id}).status_code)
+
+    assert sorted(codes) == [201] + [409] * (THREADS - 1)
+    with app.app_context():
+        assert Consultation.query.filter_by(triage_id=triage_id).count() == 1
+
+
+def test_concurrent_queue_requests_create_one_consultation(app, seed, client_as):
+    patient_acc, patient_id = seed.patient()
+    triage_id = seed.triage(patient_id)
+
+    codes = race(THREADS, lambda i: client_as(patient_acc, 'User').post(
+        '/user/consultation/queue', json={'triage_id': triage_id}).status_code)
+
+    assert sorted(codes) == [201] + [409] * (THREADS - 1)
+
+
+def test_concurrent_accepts_have_one_winner(app, seed, client_as):
+    _, patient_id = seed.patient()
+    doctor_acc, doctor_id = seed.doctor()
+    cons_id = seed.consultation(patient_id, doctor_id, seed.triage(patient_id))
+
+    codes = race(THREADS, lambda i: client_as(doctor_acc, 'Doctor').post(
+        f'/otochat/respond/{cons_id}', json={'action': 'accepted'}).status_code)
+
+    assert sorted(codes) == [200] + [409] * (THREADS - 1)
+    with app.app_context():
+        assert db.session.get(Consultation, cons_id).status == 'accepted'
+        assert db.session.get(Doctor, doctor_id).is_available_online is False
+
+
+def test_concurrent_accept_and_reject_have_one_winner(app, seed, client_as):
+    _, patient_id = seed.patient()
+    doctor_acc, doctor_id = seed.doctor()
+    cons_id = seed.consultation(patient_id, doctor_id, seed.triage(patient_id))
+
+    actions = ['accepted', 'rejected'] * (THREADS // 2)
+    codes = race(THREADS, lambda i: client_as(doctor_acc, 'Doctor').post(
+        f'/otochat/respond/{cons_id}', json={'action': actions[i]}).status_code)
+
+    assert codes.count(200) == 1
+    winner = actions[codes.index(200)]
+    with app.app_context():
+        assert db.session.get(Consultation, cons_id).status == winner
+
+
+def test_concurrent_ends_have_one_winner(app, seed, client_as):
+    _, patient_id = seed.patient()
+    doctor_acc, doctor_id = seed.doctor()
+    cons_id = seed.consultation(patient_id, doctor_id, seed.triage(patient_id), status='accepted')
+
+    codes = race(THREADS, lambda i: client_as(doctor_acc, 'Doctor').post(
+        '/otochat/end', json={'consultationId': cons_id, 'summary': f'summary from thread {i}'}).status_code)
+
+    assert sorted(codes) == [200] + [409] * (THREADS - 1)
+    with app.app_context():
+        cons = db.session.get(Consultation, cons_id)
+        assert cons.status == 'completed'
+        assert cons.clinical_summary.startswith('summary from thread')
+
+
+def test_concurrent_claims_assign_a_queued_request_once(app, seed):
+    from dispatch import dispatch_engine
+    _, patient_id = seed.patient()
+    doctors = [seed.doctor()[1] for _ in range(8)]
+    cons_id = seed.consultation(patient_id, None, seed.triage(patient_id), status='queued')
+
+    def claim(i):
+        with app.app_context():
+            return dispatch_engine.claim(cons_id, doctors[i])
+
+    results = race(len(doctors), claim)
+
+    assert results.count(True) == 1
+    with app.app_context():
+        cons = db.session.get(Consultation, cons_id)
+        assert cons.status == 'pending'
+        assert cons.doctor_id == doctors[results.index(True)]
+
+
+def test_other_doctor_cannot_accept_queued_request(app, seed, client_as):
+    _, patient_id = seed.patient()
+    doctor_acc, _ = seed.doctor()
+    cons_id = seed.consultation(patient_id, None, seed.triage(patient_id), status='queued')
+
+    response = client_as(doctor_acc, 'Doctor').post(f'/otochat/respond/{cons_id}', json={'action': 'accepted'})
+
+    assert response.status_code == 404
+    with app.app_context():
+        assert db.session.get(Consultation, cons_id).status == 'queued'
@@ -0,0 +1,27 @@
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+
+def test_slow_statement_is_timed_after_a_failed_one(app, database, monkeypatch):
+    from metrics import db_metrics
+    monkeypatch.setattr(db_metrics, 'slow_query_ms', 1)
+    # Counting to 200k in SQLite takes well over 1 ms
+    slow_sql = ("WITH RECURSIVE n(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM n WHERE x < 200000) "
+                "SELECT count(*) FROM n")
+
+    with app.app_context():
+        with database.engine.connect() as conn:
+            info_before = dict(conn.info)
+            with pytest.raises(OperationalError):
+                conn.execute(text("SELECT * FROM no_such_table"))
+            before = db_metrics.statements
+            conn.execute(text(slow_sql))
+
+            assert db_metrics.statements == before + 1
+            assert dict(conn.info) == info_before
+
+    slow = db_metrics.slow_queries[-1]
+    assert slow['statement'] == slow_sql
+    assert slow['ms'] >= 1
+    assert not any('no_such_table' in entry['statement'] for entry in db_metrics.slow_queries)
@@ -0,0 +1,77 @@
+from extension import db
+from model import Consultation
+
+
+def queue_directly(app, seed, patient_id, flag, priority):
+    """A queued row written the way another worker process would: straight to the DB, never enqueued here."""
+    triage_id = seed.triage(patient_id, flag=flag)
+    with app.app_context():
+        cons = Consultation(patient_id=patient_id, triage_id=triage_id, status='queued',
+                            specialty_key='', priority=priority)
+        db.session.add(cons)
+        db.session.commit()
+        return cons.id
+
+
+def test_doctor_coming_online_takes_requests_queued_elsewhere(app, seed, client_as):
+    from dispatch import dispatch_engine
+    _, patient_id = seed.patient()
+    doctor_acc, doctor_id = seed.doctor(online=False)
+
+    # This process has already looked at an (empty) queue once
+    with app.app_context():
+        dispatch_engine.dispatch()
+    green = queue_directly(app, seed, patient_id, 'GREEN', 3)
+    red = queue_directly(app, seed, patient_id, 'RED', 1)
+
+    response = client_as(doctor_acc, 'Doctor').put('/doctor/update', json={'available': True})
+    assert response.status_code == 200
+
+    with app.app_context():
+        # Most urgent first; capacity 1 leaves the other waiting
+        assert db.session.get(Consultation, red).doctor_id == doctor_id
+        assert db.session.get(Consultation, red).status == 'pending'
+        assert db.session.get(Consultation, green).status == 'queued'
+        assert dispatch_engine.position(green) == 1
+
+
+def test_position_counts_requests_ahead(app, seed):
+    from dispatch import dispatch_engine
+    _, patient_id = seed.patient()
+    first_green = queue_directly(app, seed, patient_id, 'GREEN', 3)
+    yellow = queue_directly(app, seed, patient_id, 'YELLOW', 2)
+    second_green = queue_directly(app, seed, patient_id, 'GREEN', 3)
+    red = queue_directly(app, seed, patient_id, 'RED', 1)
+
+    with app.app_context():
+        assert [dispatch_engine.position(c) for c in (red, yellow, first_green, second_green)] == [1, 2, 3, 4]
+
+
+def test_queue_reads_go_through_the_queued_index(app, seed):
+    from sqlalchemy import event
+    from dispatch import dispatch_engine
+    _, patient_id = seed.patient()
+    cons_id = queue_directly(app, seed, patient_id, 'GREEN', 3)
+
+    with app.app_context():
+        engine = db.engine
+        issued = []
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            issued.append((statement, parameters))
+
+        event.listen(engine, 'before_cursor_execute', record)
+        try:
+            dispatch_engine.position(cons_id)
+            db.session.execute(dispatch_engine.queue_head(''))
+        finally:
+            event.remove(engine, 'before_cursor_execute', record)
+        plans = [
+            " ".join(row[-1] for row in db.session.connection().exec_driver_sql("EXPLAIN QUERY PLAN " + statement,
+                                                                                 parameters))
+            for statement, parameters in issued
+        ]
+
+    # The lookup by id uses the primary key; the count of rows ahead and the head read the partial index
+    assert len(plans) == 3
+    assert all('ix_consultations_queued' in plan for plan in plans[1:]), plans
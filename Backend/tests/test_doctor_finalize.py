@@ -0,0 +1,27 @@
+from extension import db
+from model import Consultation
+
+
+def test_finalize_rolls_back_when_saving_fails(app, seed, client_as, monkeypatch):
+    import sys
+    # `routes.doctor` is shadowed by the blueprint of the same name
+    doctor_routes = sys.modules['routes.doctor']
+    _, patient_id = seed.patient()
+    doctor_acc, doctor_id = seed.doctor()
+    cons_id = seed.consultation(patient_id, doctor_id, seed.triage(patient_id), status='accepted')
+
+    def failing_complete(consult_id, doc_id, summary, **kwargs):
+        db.session.get(Consultation, consult_id).clinical_summary = summary
+        db.session.flush()
+        raise RuntimeError("disk full")
+
+    monkeypatch.setattr(doctor_routes, 'complete', failing_complete)
+
+    response = client_as(doctor_acc, 'Doctor').post(f'/doctor/consultation/{cons_id}/finalize',
+                                                     json={'summary': 'Sprain, RICE for two weeks'})
+
+    assert response.status_code == 500
+    assert response.get_json() == {"error": "Failed to save summary"}
+    with app.app_context():
+        consult = db.session.get(Consultation, cons_id)
+        assert (consult.status, consult.clinical_summary) == ('accepted', None)
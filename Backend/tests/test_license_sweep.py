@@ -0,0 +1,143 @@
+import os
+import time
+
+import pytest
+
+
+@pytest.fixture
+def uploader(app, database, tmp_path, monkeypatch):
+    """The license uploader spooling to, and storing under, a scratch directory."""
+    import storage
+    monkeypatch.setattr(storage.license_uploader, 'spool_dir', str(tmp_path / 'spool'))
+    monkeypatch.setattr(storage, '_storage', storage.LocalStorage(str(tmp_path / 'bucket'), 'http://files'))
+    os.makedirs(tmp_path / 'spool')
+    return storage.license_uploader
+
+
+def set_pending(app, db, doctor_id):
+    from model import Doctor
+    with app.app_context():
+        db.session.get(Doctor, doctor_id).license_status = 'pending'
+        db.session.commit()
+
+
+def license_status(app, db, doctor_id):
+    from model import Doctor
+    with app.app_context():
+        return db.session.get(Doctor, doctor_id).license_status
+
+
+def spool_file(uploader, doctor_id, age):
+    path = os.path.join(uploader.spool_dir, f"doc_{doctor_id}.pdf")
+    with open(path, 'wb') as f:
+        f.write(b'%PDF scan')
+    stamp = time.time() - age
+    os.utime(path, (stamp, stamp))
+    return path
+
+
+def test_sweep_retries_stale_upload(app, database, seed, uploader):
+    _, doctor_id = seed.doctor()
+    set_pending(app, database, doctor_id)
+    path = spool_file(uploader, doctor_id, uploader.retry_after + 60)
+
+    with app.app_context():
+        assert uploader.sweep() == (1, 0)
+
+    assert license_status(app, database, doctor_id) == 'uploaded'
+    assert not os.path.exists(path)
+
+
+def test_sweep_leaves_recent_upload_alone(app, database, seed, uploader):
+    _, doctor_id = seed.doctor()
+    set_pending(app, database, doctor_id)
+    path = spool_file(uploader, doctor_id, 5)
+
+    with app.app_context():
+        assert uploader.sweep() == (0, 0)
+
+    assert license_status(app, database, doctor_id) == 'pending'
+    assert os.path.exists(path)
+
+
+def test_sweep_fails_pending_row_without_file(app, database, seed, uploader):
+    _, doctor_id = seed.doctor()
+    set_pending(app, database, doctor_id)
+
+    with app.app_context():
+        assert uploader.sweep() == (0, 1)
+
+    assert license_status(app, database, doctor_id) == 'failed'
+
+
+def test_sweep_removes_file_of_uncommitted_signup(app, database, uploader):
+    path = spool_file(uploader, 999, uploader.retry_after + 60)
+
+    with app.app_context():
+        assert uploader.sweep() == (0, 0)
+
+    assert not os.path.exists(path)
+
+
+class FlakyStorage:
+    """LocalStorage that raises on the first `failures` uploads, like a dropped connection."""
+
+    def __init__(self, inner, failures):
+        self.inner = inner
+        self.failures = failures
+
+    def upload(self, *args, **kwargs):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("connection reset by peer")
+        return self.inner.upload(*args, **kwargs)
+
+    def public_url(self, bucket, path):
+        return self.inner.public_url(bucket, path)
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.02)
+    return condition()
+
+
+def license_attempts(app, db, doctor_id):
+    from model import Doctor
+    with app.app_context():
+        return db.session.get(Doctor, doctor_id).license_attempts
+
+
+def test_transient_upload_error_keeps_the_scan_and_retries(app, database, seed, uploader, monkeypatch):
+    import storage
+    monkeypatch.setattr(storage, '_storage', FlakyStorage(storage._storage, failures=1))
+    monkeypatch.setattr(uploader, 'retry_backoff', 0.3)
+    _, doctor_id = seed.doctor()
+    set_pending(app, database, doctor_id)
+    path = spool_file(uploader, doctor_id, 0)
+
+    uploader._process(doctor_id, path, 'pdf', 'application/pdf')
+    assert license_status(app, database, doctor_id) == 'pending'
+    assert license_attempts(app, database, doctor_id) == 1
+    assert os.path.exists(path)
+
+    assert wait_for(lambda: license_status(app, database, doctor_id) == 'uploaded')
+    # Removed right after the commit, on the worker thread
+    assert wait_for(lambda: not os.path.exists(path))
+
+
+def test_upload_gives_up_after_max_attempts(app, database, seed, uploader, monkeypatch):
+    import storage
+    monkeypatch.setattr(storage, '_storage', FlakyStorage(storage._storage, failures=100))
+    monkeypatch.setattr(uploader, 'retry_backoff', 0.01)
+    monkeypatch.setattr(uploader, 'max_attempts', 3)
+    _, doctor_id = seed.doctor()
+    set_pending(app, database, doctor_id)
+    path = spool_file(uploader, doctor_id, 0)
+
+    uploader._process(doctor_id, path, 'pdf', 'application/pdf')
+
+    assert wait_for(lambda: license_status(app, database, doctor_id) == 'failed')
+    assert license_attempts(app, database, doctor_id) == 3
+    assert wait_for(lambda: not os.path.exists(path))
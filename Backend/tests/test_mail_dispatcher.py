@@ -0,0 +1,180 @@
+import socketserver
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+from flask import Flask
+from sqlalchemy import event
+
+
+class FakeSMTPHandler(socketserver.StreamRequestHandler):
+    """Just enough SMTP for smtplib. Queued server.rcpt_replies answer RCPT before it starts accepting."""
+
+    def reply(self, line):
+        self.wfile.write(line.encode() + b"\r\n")
+
+    def handle(self):
+        server = self.server
+        self.reply("220 fake ESMTP")
+        for line in self.rfile:
+            command = line.decode().strip()
+            verb = command.split(' ', 1)[0].upper()
+            if verb in ('EHLO', 'HELO'):
+                self.reply("250 fake")
+            elif verb in ('MAIL', 'RSET', 'NOOP'):
+                self.reply("250 OK")
+            elif verb == 'RCPT':
+                if server.rcpt_replies:
+                    self.reply(server.rcpt_replies.pop(0))
+                else:
+                    server.recipients.append(command.split(':', 1)[1].strip(' <>'))
+                    self.reply("250 OK")
+            elif verb == 'DATA':
+                self.reply("354 go ahead")
+                body = []
+                for data in self.rfile:
+                    if data == b".\r\n":
+                        break
+                    body.append(data)
+                server.messages.append(b"".join(body).decode())
+                self.reply("250 queued")
+            elif verb == 'QUIT':
+                self.reply("221 bye")
+                return
+            else:
+                self.reply("502 not implemented")
+
+
+class FakeSMTPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), FakeSMTPHandler)
+        self.rcpt_replies = []
+        self.recipients = []
+        self.messages = []
+
+
+@pytest.fixture
+def smtp(app, monkeypatch):
+    """A local SMTP stand-in that app's Flask-Mail connections go to."""
+    from extension import mail
+    server = FakeSMTPServer()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setitem(app.extensions, 'mail', mail.init_mail({
+        'MAIL_SERVER': '127.0.0.1', 'MAIL_PORT': server.server_address[1],
+        'MAIL_USE_TLS': False, 'MAIL_SUPPRESS_SEND': False
+    }))
+    monkeypatch.setitem(app.config, 'MAIL_DEFAULT_SENDER', 'noreply@test')
+    monkeypatch.setitem(app.config, 'MAIL_RETRY_BACKOFF', 30)
+    monkeypatch.setitem(app.config, 'MAIL_MAX_ATTEMPTS', 5)
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def dispatcher(app, database, smtp):
+    from utilities import MailDispatcher
+    dispatcher = MailDispatcher()
+    # Driven by hand through drain_once; the polling thread is never started
+    dispatcher.app = app
+    yield dispatcher
+    dispatcher._close_connection()
+
+
+def outbox_row(app, db, **fields):
+    from model import MailOutbox
+    with app.app_context():
+        row = MailOutbox(recipient='patient@test', subject='Hello', body='Your results', **fields)
+        db.session.add(row)
+        db.session.commit()
+        return row.id
+
+
+def load(app, db, row_id):
+    from model import MailOutbox
+    with app.app_context():
+        row = db.session.get(MailOutbox, row_id)
+        db.session.expunge(row)
+        return row
+
+
+def test_delivered_row_is_marked_sent(app, database, smtp, dispatcher):
+    row_id = outbox_row(app, database)
+
+    with app.app_context():
+        assert dispatcher.drain_once()
+        assert not dispatcher.drain_once()
+
+    row = load(app, database, row_id)
+    assert (row.status, row.attempts, row.last_error) == ('sent', 1, None)
+    assert row.sent_at is not None
+    assert smtp.recipients == ['patient@test']
+    assert 'Your results' in smtp.messages[0]
+
+
+def test_transient_failure_is_retried_after_backoff(app, database, smtp, dispatcher):
+    row_id = outbox_row(app, database)
+    smtp.rcpt_replies.append("451 4.3.0 try again later")
+
+    with app.app_context():
+        before = datetime.utcnow()
+        assert dispatcher.drain_once()
+        # Not due again until the backoff has passed
+        assert not dispatcher.drain_once()
+
+    row = load(app, database, row_id)
+    assert (row.status, row.attempts) == ('pending', 1)
+    assert '451' in row.last_error
+    assert before + timedelta(seconds=29) <= row.next_attempt_at <= datetime.utcnow() + timedelta(seconds=31)
+    assert smtp.messages == []
+
+    from model import MailOutbox
+    with app.app_context():
+        # Let the backoff elapse
+        database.session.get(MailOutbox, row_id).next_attempt_at = datetime.utcnow() - timedelta(seconds=1)
+        database.session.commit()
+        assert dispatcher.drain_once()
+
+    row = load(app, database, row_id)
+    assert (row.status, row.attempts) == ('sent', 2)
+    assert len(smtp.messages) == 1
+
+
+def test_expired_lease_is_reclaimed_and_live_one_left_alone(app, database, smtp, dispatcher):
+    now = datetime.utcnow()
+    # Claimed by a dispatcher that died mid-batch; its lease ran out a minute ago
+    orphaned = outbox_row(app, database, status='sending', claimed_by='dead', attempts=1,
+                          next_attempt_at=now - timedelta(minutes=1))
+    # Claimed by a dispatcher that is still working on it
+    in_flight = outbox_row(app, database, status='sending', claimed_by='alive', attempts=1,
+                           next_attempt_at=now + timedelta(minutes=4))
+
+    with app.app_context():
+        assert dispatcher.drain_once()
+
+    row = load(app, database, orphaned)
+    assert (row.status, row.attempts) == ('sent', 2)
+    assert row.claimed_by != 'dead'
+    row = load(app, database, in_flight)
+    assert (row.status, row.claimed_by, row.attempts) == ('sending', 'alive', 1)
+    assert len(smtp.messages) == 1
+
+
+def test_dispatcher_starts_with_the_first_request_not_at_import():
+    from extension import db
+    from utilities import MailDispatcher
+
+    app = Flask(__name__)
+    app.config.update(MAIL_QUEUE_ENABLED=True, MAIL_QUEUE_POLL_INTERVAL=3600)
+    dispatcher = MailDispatcher()
+    dispatcher.init_app(app)
+    try:
+        assert dispatcher._thread is None
+
+        app.test_client().get('/')
+        assert dispatcher._thread is not None and dispatcher._thread.is_alive()
+    finally:
+        event.remove(db.session, 'after_commit', dispatcher._after_commit)
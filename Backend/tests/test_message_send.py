@@ -0,0 +1,53 @@
+def test_send_is_refused_once_the_consultation_ends(seed, client_as):
+    patient_acc, patient_id = seed.patient()
+    doctor_acc, doctor_id = seed.doctor()
+    cons_id = seed.consultation(patient_id, doctor_id, seed.triage(patient_id), status='accepted')
+    patient = client_as(patient_acc, 'User')
+
+    # A string id must hit the same cache entry the end transition invalidates
+    assert patient.post('/otochat/send', json={'consultationId': str(cons_id), 'content': 'hi'}).status_code == 201
+    assert client_as(doctor_acc, 'Doctor').post(
+        '/otochat/end', json={'consultationId': cons_id, 'summary': 'ankle sprain, rest'}).status_code == 200
+
+    response = patient.post('/otochat/send', json={'consultationId': str(cons_id), 'content': 'late'})
+    assert response.status_code == 403
+
+
+def test_send_rejects_a_malformed_id(seed, client_as):
+    patient_acc, _ = seed.patient()
+    response = client_as(patient_acc, 'User').post('/otochat/send', json={'consultationId': 'abc', 'content': 'hi'})
+    assert response.status_code == 400
+
+
+def test_timed_out_group_write_is_withdrawn():
+    from message_writer import MessageWriter
+    # No worker thread, so nothing ever flushes
+    writer = MessageWriter()
+    writer.mode = 'group'
+    writer.timeout = 0.01
+
+    try:
+        writer.submit(1, 1, 'hi')
+    except TimeoutError:
+        pass
+    else:
+        raise AssertionError("submit should time out")
+    assert writer.snapshot()['buffered'] == 0
+
+
+def test_group_write_already_being_flushed_is_reported_pending():
+    from collections import deque
+    from message_writer import MessageWriter
+
+    class TakenQueue(deque):
+        # Stands in for the worker having popped the message into a batch
+        def remove(self, value):
+            raise ValueError(value)
+
+    writer = MessageWriter()
+    writer.mode = 'group'
+    writer.timeout = 0.01
+    writer._queue = TakenQueue()
+
+    msg = writer.submit(1, 1, 'hi')
+    assert msg.id is None
@@ -0,0 +1,22 @@
+import pytest
+
+from metrics import RequestProfiler
+
+LOCAL = {'REMOTE_ADDR': '127.0.0.1'}
+
+
+@pytest.mark.parametrize('token, headers, environ, allowed', [
+    (None, {}, LOCAL, True),
+    # The reverse proxy connects from localhost too
+    (None, {'X-Forwarded-For': '203.0.113.9'}, LOCAL, False),
+    (None, {'Forwarded': 'for=203.0.113.9'}, LOCAL, False),
+    (None, {}, {'REMOTE_ADDR': '203.0.113.9'}, False),
+    ('s3cret', {}, LOCAL, False),
+    ('s3cret', {'Authorization': 'Bearer wrong'}, LOCAL, False),
+    ('s3cret', {'Authorization': 'Bearer s3cret', 'X-Forwarded-For': '203.0.113.9'}, LOCAL, True),
+])
+def test_metrics_access(app, token, headers, environ, allowed):
+    profiler = RequestProfiler()
+    profiler.token = token
+    with app.test_request_context('/metrics', headers=headers, environ_base=environ):
+        assert profiler.allowed() is allowed
@@ -0,0 +1,74 @@
+import os
+import signal
+
+from hashing import PasswordHasher
+
+
+class FakeApp:
+    def __init__(self, **config):
+        self.config = config
+
+
+def test_pool_is_created_on_first_hash_and_replaced_when_broken():
+    hasher = PasswordHasher()
+    hasher.init_app(FakeApp(BCRYPT_LOG_ROUNDS=4, PASSWORD_HASH_WORKERS=1))
+    assert hasher._pool is None
+
+    hashed = hasher.hash("correct horse")
+    pool = hasher._pool
+    assert pool is not None and hasher.check(hashed, "correct horse")
+
+    try:
+        for pid in list(pool._processes):
+            os.kill(pid, signal.SIGKILL)
+        # The dead worker breaks the pool; the hasher starts another and carries on
+        assert hasher.check(hashed, "correct horse")
+        assert hasher._pool is not pool
+    finally:
+        hasher._pool.shutdown()
+
+
+def test_pool_is_rebuilt_in_a_forked_worker():
+    hasher = PasswordHasher()
+    hasher.init_app(FakeApp(BCRYPT_LOG_ROUNDS=4, PASSWORD_HASH_WORKERS=1))
+    hasher.hash("warm up")
+    inherited = hasher._pool
+    try:
+        # What a gunicorn --preload worker sees: the master's pool object, from another pid
+        hasher._pool_pid = -1
+        assert hasher.check(hasher.hash("x"), "x")
+        assert hasher._pool is not inherited
+    finally:
+        inherited.shutdown()
+        hasher._pool.shutdown()
+
+
+def stored_hash(app, db, acc_id):
+    from model import Account
+    with app.app_context():
+        return db.session.get(Account, acc_id).password
+
+
+def test_login_upgrades_a_hash_made_with_fewer_rounds(app, database, seed, monkeypatch):
+    from model import Account
+    from hashing import passwords
+    acc_id, _ = seed.patient()
+    with app.app_context():
+        account = database.session.get(Account, acc_id)
+        account.password = passwords.hash("correct horse")
+        database.session.commit()
+        email = account.email
+    old = stored_hash(app, database, acc_id)
+    assert old.split('$')[2] == '04'
+
+    monkeypatch.setattr(passwords, 'rounds', 5)
+    resp = app.test_client().post('/auth/login', json={'Email': email, 'Password': "correct horse"})
+
+    assert resp.status_code == 200
+    new = stored_hash(app, database, acc_id)
+    assert new != old and new.split('$')[2] == '05'
+    assert passwords.check(new, "correct horse")
+
+    # Already at the configured cost: left as it is
+    app.test_client().post('/auth/login', json={'Email': email, 'Password': "correct horse"})
+    assert stored_hash(app, database, acc_id) == new
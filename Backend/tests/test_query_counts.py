@@ -0,0 +1,62 @@
+"""Statements per request on the profile and consultation hot paths.
+
+The current account's profile is loaded once per request (utilities.load_profile)
+and related rows are joined in, so each count below is the floor for the endpoint.
+"""
+from conftest import verbs
+
+
+def test_doctor_profile_is_one_query(seed, client_as, sql_statements):
+    doctor_acc, _ = seed.doctor()
+    client = client_as(doctor_acc, 'Doctor')
+
+    sql_statements.clear()
+    response = client.get('/doctor/profile')
+
+    assert response.status_code == 200
+    assert response.get_json()['email'].startswith('doctor')
+    # Doctor joined with its account
+    assert len(sql_statements) == 1
+
+
+def test_consultation_status_is_two_queries(seed, client_as, sql_statements):
+    patient_acc, patient_id = seed.patient()
+    _, doctor_id = seed.doctor()
+    cons_id = seed.consultation(patient_id, doctor_id, seed.triage(patient_id))
+    client = client_as(patient_acc, 'User')
+
+    sql_statements.clear()
+    response = client.get(f'/user/consultation/status/{cons_id}')
+
+    assert response.status_code == 200
+    # The patient's profile, then the consultation joined with its doctor
+    assert len(sql_statements) == 2
+
+
+def test_respond_is_three_queries(seed, client_as, sql_statements):
+    _, patient_id = seed.patient()
+    doctor_acc, doctor_id = seed.doctor()
+    cons_id = seed.consultation(patient_id, doctor_id, seed.triage(patient_id))
+    client = client_as(doctor_acc, 'Doctor')
+
+    sql_statements.clear()
+    response = client.post(f'/otochat/respond/{cons_id}', json={'action': 'accepted'})
+
+    assert response.status_code == 200
+    # Doctor profile, the conditional status UPDATE, the availability UPDATE
+    assert verbs(sql_statements) == ['SELECT', 'UPDATE', 'UPDATE']
+
+
+def test_end_is_four_queries(seed, client_as, sql_statements):
+    _, patient_id = seed.patient()
+    doctor_acc, doctor_id = seed.doctor()
+    cons_id = seed.consultation(patient_id, doctor_id, seed.triage(patient_id), status='accepted')
+    client = client_as(doctor_acc, 'Doctor')
+
+    sql_statements.clear()
+    response = client.post('/otochat/end', json={'consultationId': cons_id, 'summary': 'rest and ice'})
+
+    assert response.status_code == 200
+    # Doctor profile, the completing UPDATE, the availability UPDATE, then the
+    # dispatcher's read of the (empty) queue
+    assert verbs(sql_statements) == ['SELECT', 'UPDATE', 'UPDATE', 'SELECT']
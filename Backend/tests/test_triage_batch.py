@@ -0,0 +1,37 @@
+import random
+
+from routes.triage import ANSWER_KEYS, encode_answers, encode_answers_batch, run_triage_batch, run_triage_logic
+
+
+def test_batch_matches_the_scalar_rules_on_messy_input():
+    rng = random.Random(7)
+    answers = (0, 1, '0', '1', None, True, False, 1.0, 'x')
+    ages = (None, 0.5, 12, '30', 70, True, 'nan', ' 40 ', 'abc')
+    responses = [dict({k: rng.choice(answers) for k in ANSWER_KEYS}, V0_AGE=rng.choice(ages)) for _ in range(500)]
+    responses.append({'V1_ACCIDENT': 1})  # partial answers, no age
+
+    assert encode_answers_batch(responses).tolist() == [encode_answers(r) for r in responses]
+    assert run_triage_batch(responses) == [run_triage_logic(r) for r in responses]
+
+
+def test_batch_matches_on_plain_int_answers():
+    rng = random.Random(3)
+    responses = [dict({k: rng.choice((0, 1)) for k in ANSWER_KEYS}, V0_AGE=rng.choice((0.5, 12, 30, 70)))
+                 for _ in range(500)]
+
+    assert run_triage_batch(responses) == [run_triage_logic(r) for r in responses]
+
+
+def test_batch_reads_non_scalar_ages_like_the_scalar_rules():
+    for ages in (([5], [5], [5]), ([5, 6], [1, 2], [3, 4]), ([5], 70, 12), ({'y': 5}, 30, 30)):
+        responses = [{'V0_AGE': age} for age in ages]
+        assert run_triage_batch(responses) == [run_triage_logic(r) for r in responses]
+
+
+def test_evaluate_batch_matches_evaluate_for_list_ages(app):
+    client = app.test_client()
+    single = client.post('/triage/evaluate', json={'V0_AGE': [5]}).get_json()
+    batch = client.post('/triage/evaluate_batch', json=[{'V0_AGE': [5]}] * 3)
+
+    assert batch.status_code == 200
+    assert [r['flag'] for r in batch.get_json()['results']] == [single['flag']] * 3
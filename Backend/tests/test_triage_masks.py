@@ -0,0 +1,91 @@
+from sqlalchemy import text
+
+from model import TRIAGE_ANSWER_BITS, TRIAGE_ANSWER_COLUMNS
+
+
+def test_answers_round_trip_through_the_masks(app, database, seed):
+    from model import TriageSession
+    _, user_id = seed.patient()
+    answers = {'v1_accident': 1, 'v2_walking': 0, 'v3_lateral': 1, 'v5_swelling': 0}
+
+    with app.app_context():
+        session = TriageSession(user_id=user_id, **answers)
+        database.session.add(session)
+        database.session.commit()
+        session_id = session.id
+
+    with app.app_context():
+        session = database.session.get(TriageSession, session_id)
+        assert {c: getattr(session, c) for c in TRIAGE_ANSWER_COLUMNS} == dict.fromkeys(TRIAGE_ANSWER_COLUMNS) | answers
+        assert session.answered_mask == sum(TRIAGE_ANSWER_BITS[c] for c in answers)
+        assert session.value_mask == TRIAGE_ANSWER_BITS['v1_accident'] | TRIAGE_ANSWER_BITS['v3_lateral']
+
+        # Flipping and clearing an answer only touches its own bit
+        session.v1_accident = 0
+        session.v3_lateral = None
+        database.session.commit()
+
+    with app.app_context():
+        session = database.session.get(TriageSession, session_id)
+        assert (session.v1_accident, session.v3_lateral, session.v2_walking) == (0, None, 0)
+        assert session.value_mask == 0
+        assert not session.answered_mask & TRIAGE_ANSWER_BITS['v3_lateral']
+
+
+def test_hybrid_filters_in_sql(app, database, seed):
+    from model import TriageSession
+    _, user_id = seed.patient()
+
+    with app.app_context():
+        yes = TriageSession(user_id=user_id, v2_walking=1)
+        no = TriageSession(user_id=user_id, v2_walking=0)
+        unanswered = TriageSession(user_id=user_id, v1_accident=1)
+        database.session.add_all([yes, no, unanswered])
+        database.session.commit()
+        ids = {'yes': yes.id, 'no': no.id, 'unanswered': unanswered.id}
+
+        def matching(criterion):
+            stmt = database.select(TriageSession.id).where(criterion).order_by(TriageSession.id)
+            return database.session.scalars(stmt).all()
+
+        assert matching(TriageSession.v2_walking == 1) == [ids['yes']]
+        assert matching(TriageSession.v2_walking == 0) == [ids['no']]
+        assert matching(TriageSession.v2_walking.is_(None)) == [ids['unanswered']]
+
+
+def test_migration_packs_legacy_answer_columns(app, database, seed):
+    import migrations
+    from model import TriageSession
+    from routes.triage import gen_soap_note
+    _, user_id = seed.patient()
+    legacy = {'v1_accident': 1, 'v2_walking': 1, 'v3_lateral': 0, 'v3_medial': None,
+              'v4_midfoot': 1, 'v4_navicular': 0, 'v5_swelling': None, 'v6_stability': 0}
+
+    with app.app_context():
+        with database.engine.begin() as conn:
+            for column in TRIAGE_ANSWER_COLUMNS:
+                conn.execute(text(f"ALTER TABLE triage_sessions ADD COLUMN {column} INTEGER"))
+            # As the row looks after ADD COLUMN ... DEFAULT 0 on an old database
+            conn.execute(text(
+                f"INSERT INTO triage_sessions (user_id, v0_age, final_flag, answered_mask, value_mask, "
+                f"{', '.join(legacy)}) VALUES (:user_id, 30, 'RED', 0, 0, {', '.join(':' + c for c in legacy)})"
+            ), dict(legacy, user_id=user_id))
+        migrations.migrate_triage_answer_masks()
+
+        session = database.session.scalars(database.select(TriageSession)).one()
+        assert session.answered_mask == sum(TRIAGE_ANSWER_BITS[c] for c, v in legacy.items() if v is not None)
+        assert session.value_mask == sum(TRIAGE_ANSWER_BITS[c] for c, v in legacy.items() if v == 1)
+        assert {c: getattr(session, c) for c in TRIAGE_ANSWER_COLUMNS} == legacy
+
+        response = dict({c.upper(): v for c, v in legacy.items() if v is not None}, V0_AGE=30.0)
+        assert session.soap_note == gen_soap_note(response, 'RED')
+        assert "High-Impact" in session.soap_s
+        assert session.soap_o == ("Objective: Exam Findings: Inability to bear weight, "
+                                  "Base of 5th Metatarsal tenderness")
+
+        # A second run leaves already-packed rows alone
+        session.v1_accident = 0
+        database.session.commit()
+        migrations.migrate_triage_answer_masks()
+        database.session.refresh(session)
+        assert session.v1_accident == 0
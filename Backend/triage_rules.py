@@ -0,0 +1,77 @@
+from functools import lru_cache
+from model import TRIAGE_ANSWER_COLUMNS
+
+# Ottawa ankle rule data shared by the triage routes, the chat flow, the
+# dispatcher and TriageSession.soap_note. Kept out of routes/ so the model
+# layer never imports a blueprint module.
+
+# Canonical answer bitmask: bit i is set when ANSWER_KEYS[i] was answered '1'.
+# Shares its bit order with the packed TriageSession.value_mask column.
+ANSWER_KEYS = [name.upper() for name in TRIAGE_ANSWER_COLUMNS]
+ANSWER_BITS = {key: 1 << i for i, key in enumerate(ANSWER_KEYS)}
+
+FINDINGS = {
+    'V2_WALKING': "Inability to bear weight",
+    'V3_LATERAL': "Lateral Malleolus tenderness",
+    'V3_MEDIAL': "Medial Malleolus tenderness",
+    'V4_MIDFOOT': "Base of 5th Metatarsal tenderness",
+    'V4_NAVICULAR': "Navicular bone tenderness"
+}
+
+RECOMMENDATIONS = {
+    "RED": {
+        "title": "EMERGENCY CARE REQUIRED",
+        "text": "High risk of fracture detected. Inability to bear weight or bone tenderness requires immediate X-ray imaging at a Trauma Center.",
+        "emergency_numbers": [
+            {"label": "Ambulance (Nepal Red Cross)", "number": "102"},
+            {"label": "Police", "number": "100"}
+        ],
+        "cta_label": "Call Ambulance (102)",
+        "show_doctors": False,
+        "color_code": "#EE3E3E",
+        "priority": 1
+    },
+    "YELLOW": {
+        "title": "Urgent Specialist Review",
+        "text": "Symptoms suggest potential ligamentous injury or age-related risks (Pediatric/Geriatric). Specialist review recommended.",
+        "cta_label": "Book Orthopedist",
+        "show_doctors": True,
+        "color_code": "#E7E13B",
+        "priority": 2
+    },
+    "GREEN": {
+        "title": "Home Care (RICE)",
+        "text": "Low risk of fracture. Follow Rest, Ice, Compression, and Elevation (RICE) for 48 hours.",
+        "cta_label": "View Recovery Guide",
+        "show_doctors": False,
+        "color_code": "#10B981",
+        "priority": 3
+    }
+}
+
+@lru_cache(maxsize=None)
+def soap_fragments(mask, flag):
+    """Everything in the SOAP note except the age, which is spliced between the subjective halves."""
+    trauma = "High-Impact" if mask & ANSWER_BITS['V1_ACCIDENT'] else "Low-impact"
+    findings = [desc for key, desc in FINDINGS.items() if mask & ANSWER_BITS[key]]
+
+    o = "Objective: Exam Findings: " + (", ".join(findings) if findings else "No focal bone tenderness noted.")
+    a = f"Assessment: {flag} status. Ottawa Ankle Rules {'Positive' if flag == 'RED' else 'Negative/Inconclusive'}."
+
+    if flag == "RED":
+        p = "Plan: Immediate referral to the nearest Trauma Center (Nepal) for radiographic imaging (X-ray)."
+    elif flag == "YELLOW":
+        p = "Plan: Orthopedic specialist consultation for joint stability evaluation and ligamentous assessment."
+    else:
+        p = "Plan: Home management via RICE protocol. Patient to monitor for increased pain or neurovascular changes."
+
+    return "Subjective: Patient (", f"y) reports {trauma} injury to the ankle.", o, a, p
+
+def soap_from_mask(mask, flag, age):
+    head, tail, o, a, p = soap_fragments(mask, flag)
+    return {"subjective": f"{head}{age}{tail}", "objective": o, "assessment": a, "plan": p}
+
+# Warm the table for every real outcome so requests never build fragments
+for _flag in RECOMMENDATIONS:
+    for _mask in range(1 << len(ANSWER_KEYS)):
+        soap_fragments(_mask, _flag)
@@ -1,30 +1,123 @@
-from extension import mail
+from extension import db, mail
 from flask_mail import Message
-from flask import current_app
+from flask import current_app, g
+from sqlalchemy import event, func, String
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import FunctionElement
+from model import TRIAGE_ANSWER_BITS, MailOutbox
+from config import Config
+from collections import namedtuple
+from types import MappingProxyType
 import random, string
 import os
 import json
-from datetime import datetime
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import datetime, timedelta
 
 current_dir = os.path.dirname(os.path.abspath(__file__))
 JSON_PATH = os.path.join(current_dir, 'data', 'ui_mapping.json')
 
+AGE_STEP_ID = "V0_AGE"
+
+# Answers that end the questionnaire straight away: {step id: {stored value: flag}}
+EARLY_EXITS = {
+    "V1_ACCIDENT": {1: "RED"},
+}
+
+TriageStep = namedtuple('TriageStep', [
+    'id', 'attr', 'index', 'values', 'exits', 'question', 'helper', 'image'
+])
+
+class TriageGraph(namedtuple('TriageGraph', ['steps', 'by_id'])):
+    """Immutable, pre-validated view of ui_mapping.json used by the chat state machine."""
+    __slots__ = ()
+
+    def first_unanswered(self, record):
+        for step in self.steps:
+            if getattr(record, step.attr) is None:
+                return step
+        return None
+
+    def next_step(self, step):
+        # Answers are filled strictly in order, so the successor is positional
+        nxt = step.index + 1
+        return self.steps[nxt] if nxt < len(self.steps) else None
+
+    def answers(self, record):
+        data = {step.id: getattr(record, step.attr) for step in self.steps}
+        data[AGE_STEP_ID] = float(record.v0_age)
+        return data
+
+    def snapshot(self, age, overrides=None):
+        """All answers zeroed, used when the questionnaire exits early."""
+        data = dict.fromkeys(self.by_id, 0)
+        data[AGE_STEP_ID] = float(age)
+        if overrides:
+            data.update(overrides)
+        return data
+
+def compile_ui_data(data):
+    """Validates the raw mapping and freezes it into a TriageGraph."""
+    if not isinstance(data, list) or not data:
+        raise ValueError("ui_mapping.json must be a non-empty list of questions")
+
+    steps, seen = [], set()
+    for raw in data:
+        q_id = raw.get('id')
+        if not q_id or q_id in seen:
+            raise ValueError(f"Missing or duplicate question id: {q_id!r}")
+        seen.add(q_id)
+        if q_id == AGE_STEP_ID:
+            continue
+
+        attr = q_id.lower()
+        if attr not in TRIAGE_ANSWER_BITS:
+            raise ValueError(f"{q_id} has no matching TriageSession answer")
+
+        logic, content = raw.get('logic', {}), raw.get('content', {})
+        try:
+            values = MappingProxyType({True: int(logic['yes_value']), False: int(logic['no_value'])})
+            question, helper, image = content['question'], content['helper'], content['image_key']
+        except (KeyError, TypeError, ValueError) as e:
+            raise ValueError(f"{q_id} is malformed: {e}") from e
+
+        steps.append(TriageStep(
+            id=q_id,
+            attr=attr,
+            index=len(steps),
+            values=values,
+            exits=MappingProxyType(EARLY_EXITS.get(q_id, {})),
+            question=question,
+            helper=helper,
+            image=image
+        ))
+
+    unknown = set(EARLY_EXITS) - seen
+    if unknown:
+        raise ValueError(f"Early-exit rules reference unknown questions: {sorted(unknown)}")
+
+    return TriageGraph(
+        steps=tuple(steps),
+        by_id=MappingProxyType({step.id: step for step in steps})
+    )
+
 def load_ui_data():
     try:
-        if not os.path.exists(JSON_PATH):
-       
-            return {}
         with open(JSON_PATH, 'r') as f:
             data = json.load(f)
-            print(f"SUCCESS: Loaded mapping from {JSON_PATH}")
-            return data
-    except Exception as e:
-       
-        print(f"CRITICAL ERROR: Failed to parse ui_mapping.json: {e}")
-        return {}
+    except (OSError, ValueError) as e:
+        raise RuntimeError(f"Failed to load {JSON_PATH}: {e}") from e
+
+    graph = compile_ui_data(data)
+    print(f"SUCCESS: Loaded mapping from {JSON_PATH}")
+    return graph
 
 
-UI_DATA = load_ui_data()
+TRIAGE_GRAPH = load_ui_data()
+
 def calculate_age(dob):
     if not dob:
         return 0
@@ -38,13 +131,86 @@ def calculate_age(dob):
     
     return float(years)
 
-UI_DATA = load_ui_data()
+class TTLCache:
+    """Small thread-safe in-process cache whose entries expire after ttl seconds."""
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = {}
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] > time.monotonic():
+                return entry[1]
+            self._entries.pop(key, None)
+            return None
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+        return value
+
+    def get_or_set(self, key, factory):
+        value = self.get(key)
+        if value is None:
+            value = self.set(key, factory())
+        return value
+
+    def invalidate(self, key=None):
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+# Admin dashboard aggregates; dropped on sign-up, verification and triage finalization
+dashboard_cache = TTLCache(Config.DASHBOARD_CACHE_TTL)
+# Currently-online doctors; dropped whenever a doctor's availability flips
+doctor_roster_cache = TTLCache(Config.DOCTOR_ROSTER_CACHE_TTL)
+
+class hhmm(FunctionElement):
+    """A timestamp rendered as 'HH:MM' by the database, so rows can be projected pre-formatted."""
+    type = String()
+    name = 'hhmm'
+    inherit_cache = True
+
+# The format strings go in as bound parameters, which sidesteps per-driver % escaping
+@compiles(hhmm)
+def _hhmm_default(element, compiler, **kw):
+    (value,) = element.clauses
+    return compiler.process(func.to_char(value, 'HH24:MI'), **kw)
+
+@compiles(hhmm, 'sqlite')
+def _hhmm_sqlite(element, compiler, **kw):
+    (value,) = element.clauses
+    return compiler.process(func.strftime('%H:%M', value), **kw)
+
+@compiles(hhmm, 'mysql')
+def _hhmm_mysql(element, compiler, **kw):
+    (value,) = element.clauses
+    return compiler.process(func.date_format(value, '%H:%i'), **kw)
+
+def load_profile(model, acc_id, *options):
+    """Fetches the User/Doctor row for an account once per request and reuses it.
+
+    Extra loader options (e.g. joinedload(Doctor.account)) only apply to the
+    first lookup in a request.
+    """
+    if not acc_id:
+        return None
+    cache = g.setdefault('_profiles', {})
+    key = (model, acc_id)
+    if key not in cache:
+        cache[key] = model.query.options(*options).filter_by(acc_id=acc_id).first()
+    return cache[key]
 
 def gen_pass(length=5):
     chars = string.ascii_letters + string.digits
     return ''.join(random.choices(chars, k=length))
 
-def send_mail(email, content, is_rejection=False,doc=False):
+def compose_mail(content, is_rejection=False, doc=False):
     if is_rejection:
         subject = "Update on your CuraMind Application"
         body = f"Hello,\n\n{content}\n\n- CuraMind Team"
@@ -56,10 +222,252 @@ def send_mail(email, content, is_rejection=False,doc=False):
         subject = "Your CuraMind Temporary Password"
         body = f"Hello!\n\nYour temporary password is: {content}\nPlease log in and change it immediately.\n\n- CuraMind Team"
 
+    return subject, body
+
+def send_mail(email, content, is_rejection=False,doc=False):
+    """Queues the mail in the caller's transaction; it is delivered after the caller commits.
+
+    With MAIL_QUEUE_ENABLED off the message is sent inline, as before.
+    """
+    subject, body = compose_mail(content, is_rejection, doc)
+
+    if mail_dispatcher.enabled:
+        mail_dispatcher.enqueue(email, subject, body)
+        return
+
     msg = Message(
         subject=subject,
         sender=current_app.config['MAIL_DEFAULT_SENDER'],
         recipients=[email],
         body=body
     )
-    mail.send(msg)
\ No newline at end of file
+    mail.send(msg)
+
+class RateLimiter:
+    """Spaces calls so that no more than `rate` per second get through (0 disables it)."""
+
+    def __init__(self, rate=0):
+        self.rate = rate
+        self._lock = threading.Lock()
+        self._next_slot = 0.0
+
+    def wait(self):
+        if not self.rate:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + 1.0 / self.rate
+        if slot > now:
+            time.sleep(slot - now)
+
+class MailMetrics:
+    """Delivery counters plus a sliding one-minute window for messages/sec."""
+
+    WINDOW = 60.0
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._started = time.monotonic()
+        self._recent = deque()
+        self.sent = 0
+        self.failed = 0
+        self.connections = 0
+
+    def record_sent(self):
+        now = time.monotonic()
+        with self._lock:
+            self.sent += 1
+            self._recent.append(now)
+            self._trim(now)
+
+    def record_failed(self):
+        with self._lock:
+            self.failed += 1
+
+    def record_connection(self):
+        with self._lock:
+            self.connections += 1
+
+    def _trim(self, now):
+        while self._recent and now - self._recent[0] > self.WINDOW:
+            self._recent.popleft()
+
+    def snapshot(self):
+        now = time.monotonic()
+        with self._lock:
+            self._trim(now)
+            window = min(self.WINDOW, now - self._started) or 1.0
+            return {
+                "sent": self.sent,
+                "failed": self.failed,
+                "smtp_connections": self.connections,
+                "messages_per_sec": round(len(self._recent) / window, 3)
+            }
+
+mail_metrics = MailMetrics()
+# Throttle the dispatcher applies to every message it hands to the relay
+mail_rate_limiter = RateLimiter(Config.MAIL_RATE_LIMIT)
+
+def open_mail_connection():
+    conn = mail.connect()
+    conn.__enter__()
+    mail_metrics.record_connection()
+    return conn
+
+def close_mail_connection(conn):
+    try:
+        conn.__exit__(None, None, None)
+    except Exception:
+        pass
+
+class MailDispatcher:
+    """Background worker draining the mail_outbox table over a reused SMTP connection.
+
+    Rows are claimed with a conditional UPDATE plus a lease, so several
+    processes can run a dispatcher against the same database, and mail
+    claimed by a process that died is picked up again once the lease expires.
+    """
+
+    # How long a claim is held before another dispatcher may retry it
+    CLAIM_LEASE = timedelta(minutes=5)
+
+    def __init__(self):
+        self.app = None
+        self.enabled = False
+        self._wake = threading.Event()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._conn = None
+        self._conn_sent = 0
+        self._conn_last_used = 0.0
+
+    def init_app(self, app):
+        self.app = app
+        self.enabled = app.config.get('MAIL_QUEUE_ENABLED', True)
+        mail_rate_limiter.rate = app.config.get('MAIL_RATE_LIMIT', 0)
+        if not self.enabled:
+            return
+
+        if not event.contains(db.session, 'after_commit', self._after_commit):
+            event.listen(db.session, 'after_commit', self._after_commit)
+
+        # Started by the first request rather than here, so `flask init-db` and
+        # other CLI commands don't poll a table they may be about to create
+        app.before_request(self.start)
+
+    def start(self):
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='mail-dispatcher', daemon=True)
+                self._thread.start()
+
+    def enqueue(self, recipient, subject, body):
+        db.session.add(MailOutbox(recipient=recipient, subject=subject, body=body))
+        db.session.info['mail_queued'] = True
+
+    def wake(self):
+        self._wake.set()
+
+    def _after_commit(self, session):
+        if session.info.pop('mail_queued', False):
+            self._wake.set()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.app.config['MAIL_QUEUE_POLL_INTERVAL'])
+            self._wake.clear()
+            with self.app.app_context():
+                try:
+                    while self.drain_once():
+                        pass
+                except Exception as e:
+                    db.session.rollback()
+                    print(f"Mail dispatcher error: {e}")
+                finally:
+                    db.session.remove()
+            self._close_if_idle()
+
+    def drain_once(self):
+        """Claims and delivers one batch of due mail. Returns False when nothing was due."""
+        now = datetime.utcnow()
+        due = (
+            MailOutbox.status.in_(('pending', 'sending')),
+            MailOutbox.next_attempt_at <= now
+        )
+        ids = [row.id for row in db.session.query(MailOutbox.id).filter(*due)
+               .order_by(MailOutbox.id).limit(self.app.config['MAIL_BATCH_SIZE'])]
+        if not ids:
+            db.session.rollback()
+            return False
+
+        token = uuid.uuid4().hex
+        MailOutbox.query.filter(MailOutbox.id.in_(ids), *due).update({
+            "status": 'sending',
+            "claimed_by": token,
+            "attempts": MailOutbox.attempts + 1,
+            "next_attempt_at": now + self.CLAIM_LEASE
+        }, synchronize_session=False)
+        db.session.commit()
+
+        # The whole claimed batch goes out over the same SMTP session
+        for row in MailOutbox.query.filter_by(claimed_by=token, status='sending'):
+            try:
+                self._deliver(row)
+                mail_metrics.record_sent()
+                row.status = 'sent'
+                row.sent_at = datetime.utcnow()
+                row.last_error = None
+            except Exception as e:
+                mail_metrics.record_failed()
+                self._close_connection()
+                self._schedule_retry(row, e)
+        db.session.commit()
+        self._close_connection_if_spent()
+        return True
+
+    def _schedule_retry(self, row, error):
+        row.last_error = str(error)[:500]
+        if row.attempts >= self.app.config['MAIL_MAX_ATTEMPTS']:
+            row.status = 'failed'
+            return
+        delay = self.app.config['MAIL_RETRY_BACKOFF'] * 2 ** (row.attempts - 1)
+        row.status = 'pending'
+        row.next_attempt_at = datetime.utcnow() + timedelta(seconds=delay)
+
+    def _deliver(self, row):
+        msg = Message(
+            subject=row.subject,
+            sender=self.app.config['MAIL_DEFAULT_SENDER'],
+            recipients=[row.recipient],
+            body=row.body
+        )
+        conn = self._connection()
+        mail_rate_limiter.wait()
+        conn.send(msg)
+        self._conn_sent += 1
+
+    def _connection(self):
+        if self._conn is None:
+            self._conn = open_mail_connection()
+            self._conn_sent = 0
+        self._conn_last_used = time.monotonic()
+        return self._conn
+
+    def _close_connection(self):
+        conn, self._conn = self._conn, None
+        if conn is not None:
+            close_mail_connection(conn)
+
+    def _close_connection_if_spent(self):
+        # Relays cap messages per session; start a fresh one after each full batch
+        if self._conn and self._conn_sent >= self.app.config['MAIL_BATCH_SIZE']:
+            self._close_connection()
+
+    def _close_if_idle(self):
+        if self._conn and time.monotonic() - self._conn_last_used > self.app.config['MAIL_SMTP_IDLE_TIMEOUT']:
+            self._close_connection()
+
+mail_dispatcher = MailDispatcher()
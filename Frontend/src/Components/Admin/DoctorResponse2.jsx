@@ -77,12 +77,15 @@ export default function DoctorResponse2() {
           <div className="flex flex-col items-center">
              <label className="text-[10px] font-black text-gray-400 uppercase tracking-widest block mb-4">Official Documentation</label>
              <div className="relative group overflow-hidden rounded-3xl border-4 border-gray-50 shadow-inner">
-                <img 
-                  src={getImageUrl(doctor.licenseImage)} 
-                  alt="License" 
-                  className="h-64 w-64 object-cover hover:scale-110 transition-transform duration-500 cursor-zoom-in"
-                  onError={(e) => { e.target.src = "https://via.placeholder.com/300?text=IMAGE+MISSING"; }}
-                />
+                {/* Thumbnail inline; the full-size scan only loads when opened */}
+                <a href={getImageUrl(doctor.licenseFull || doctor.licenseImage)} target="_blank" rel="noreferrer">
+                  <img 
+                    src={getImageUrl(doctor.licenseImage)} 
+                    alt="License" 
+                    className="h-64 w-64 object-cover hover:scale-110 transition-transform duration-500 cursor-zoom-in"
+                    onError={(e) => { e.target.src = "https://via.placeholder.com/300?text=IMAGE+MISSING"; }}
+                  />
+                </a>
              </div>
           </div>
         </div>
@@ -8,18 +8,30 @@ export default function User1() {
   const [selectedId, setSelectedId] = useState(null);
   const [detail, setDetail] = useState(null);
   const [loading, setLoading] = useState(true);
+  const [nextCursor, setNextCursor] = useState(null);
 
   useEffect(() => {
     fetch(`${API_BASE}/admin/triage-history`)
       .then(res => res.json())
       .then(data => {
-        setHistory(data);
+        setHistory(data.items);
+        setNextCursor(data.next_cursor);
         setLoading(false);
-        if (data.length > 0) handleSelect(data[0].session_id);
+        if (data.items.length > 0) handleSelect(data.items[0].session_id);
       })
       .catch(() => setLoading(false));
   }, []);
 
+  const loadMore = () => {
+    fetch(`${API_BASE}/admin/triage-history?cursor=${encodeURIComponent(nextCursor)}`)
+      .then(res => res.json())
+      .then(data => {
+        setHistory(prev => [...prev, ...data.items]);
+        setNextCursor(data.next_cursor);
+      })
+      .catch(err => console.error("History Error:", err));
+  };
+
   const handleSelect = (id) => {
     setSelectedId(id);
     fetch(`${API_BASE}/admin/triage-detail/${id}`)
@@ -58,6 +70,14 @@ export default function User1() {
               <p className="text-[10px] text-gray-400 mt-1 uppercase">ID: {item.acc_id}</p>
             </div>
           ))}
+          {nextCursor && (
+            <button
+              onClick={loadMore}
+              className="w-full py-3 text-[11px] font-bold text-green-700 uppercase tracking-widest hover:bg-gray-100"
+            >
+              Load older records
+            </button>
+          )}
         </div>
       </aside>
 
@@ -113,6 +113,41 @@ export default function AvailableDoctorList() {
     }
   };
 
+  // Let the server match the patient with the next free doctor, most urgent triage first
+  const handleQueueClick = async () => {
+    if (!triageId) {
+      toast.error("Triage session missing. Please restart assessment.");
+      return;
+    }
+
+    setRequestingId("queue");
+    try {
+      const res = await fetch(`${API_BASE}/user/consultation/queue`, {
+        method: "POST",
+        headers: { "Content-Type": "application/json" },
+        body: JSON.stringify({ triage_id: triageId, specialty: specialtyFilter }),
+        credentials: "include",
+      });
+      const data = await res.json();
+
+      if (res.ok) {
+        toast.success(data.status === "queued"
+          ? `You're #${data.position} in the queue`
+          : "Matched with a doctor! Waiting for them...");
+        navigate("/userpannel/waiting-room", {
+          state: { consultationId: data.consultation_id }
+        });
+      } else {
+        toast.error(data.error || `Error ${res.status}`);
+      }
+    } catch (err) {
+      console.error("🪵 FETCH EXCEPTION:", err);
+      toast.error("Network error. Could not reach server.");
+    } finally {
+      setRequestingId(null);
+    }
+  };
+
   return (
     <div className="min-h-screen bg-slate-50 flex justify-center px-4 pt-20 pb-10 font-sans">
       <div className="w-full max-w-4xl bg-white border border-slate-200 rounded-[2rem] shadow-xl p-8">
@@ -143,9 +178,18 @@ export default function AvailableDoctorList() {
             </h1>
             <p className="text-sm text-slate-500 font-medium uppercase tracking-widest mt-1">Verified & Online Now</p>
           </div>
-          <div className="flex items-center gap-2 bg-slate-50 px-4 py-2 rounded-full border border-slate-100">
-            <span className="w-2 h-2 bg-emerald-500 rounded-full animate-pulse"></span>
-            <span className="text-[10px] font-bold text-slate-700 uppercase">{doctors.length} Online</span>
+          <div className="flex items-center gap-3">
+            <button
+              onClick={handleQueueClick}
+              disabled={requestingId !== null}
+              className="px-4 py-2 text-[10px] font-black text-emerald-700 uppercase border border-emerald-200 rounded-full hover:bg-emerald-50 disabled:text-slate-300"
+            >
+              {requestingId === "queue" ? "Joining..." : "Next available doctor"}
+            </button>
+            <div className="flex items-center gap-2 bg-slate-50 px-4 py-2 rounded-full border border-slate-100">
+              <span className="w-2 h-2 bg-emerald-500 rounded-full animate-pulse"></span>
+              <span className="text-[10px] font-bold text-slate-700 uppercase">{doctors.length} Online</span>
+            </div>
           </div>
         </header>
 
@@ -20,45 +20,57 @@ export default function WaitingRoom() {
 
     localStorage.setItem("active_consult_id", consultationId);
 
-    const interval = setInterval(async () => {
-      try {
-        const res = await fetch(
-          `${API_BASE}/user/consultation/status/${consultationId}`,
-          { credentials: "include" }
-        );
+    let cancelled = false;
+    let known = "";
 
-        if (!res.ok) throw new Error("Server error");
+    // Long-poll: the server holds each request until the status changes
+    const waitForDoctor = async () => {
+      while (!cancelled) {
+        try {
+          const res = await fetch(
+            `${API_BASE}/user/consultation/status/${consultationId}?wait=25&known=${known}`,
+            { credentials: "include" }
+          );
 
-        const data = await res.json();
-        const currentStatus = data.status.toLowerCase();
-        setStatus(currentStatus);
+          if (!res.ok) throw new Error("Server error");
 
-        if (currentStatus === "accepted" || currentStatus === "in_progress") {
-          clearInterval(interval);
-          toast.success("Doctor is ready! Entering chat...");
-          navigate("/userpannel/onetoonechat", {
-            state: { consultationId },
-            replace: true
-          });
-        } 
-        else if (currentStatus === "rejected") {
-          clearInterval(interval);
-          localStorage.removeItem("active_consult_id");
-          toast.error("Doctor is unavailable.");
-          navigate("/userpannel/Avaibledoctorlist");
-        } 
-        else if (currentStatus === "completed") {
-          clearInterval(interval);
-          localStorage.removeItem("active_consult_id");
-          toast.info("Consultation ended by doctor.");
-          navigate("/userpannel/dashboard", { replace: true });
+          const data = await res.json();
+          if (cancelled) return;
+          const currentStatus = data.status.toLowerCase();
+          known = data.status;
+          setStatus(currentStatus);
+
+          if (currentStatus === "accepted" || currentStatus === "in_progress") {
+            toast.success("Doctor is ready! Entering chat...");
+            navigate("/userpannel/onetoonechat", {
+              state: { consultationId },
+              replace: true
+            });
+            return;
+          } 
+          else if (currentStatus === "rejected") {
+            localStorage.removeItem("active_consult_id");
+            toast.error("Doctor is unavailable.");
+            navigate("/userpannel/Avaibledoctorlist");
+            return;
+          } 
+          else if (currentStatus === "completed") {
+            localStorage.removeItem("active_consult_id");
+            toast.info("Consultation ended by doctor.");
+            navigate("/userpannel/dashboard", { replace: true });
+            return;
+          }
+        } catch (err) {
+          console.error("Polling error:", err);
+          // Back off before retrying so a down server isn't hammered
+          await new Promise(resolve => setTimeout(resolve, 2500));
         }
-      } catch (err) {
-        console.error("Polling error:", err);
       }
-    }, 2500);
+    };
+
+    waitForDoctor();
 
-    return () => clearInterval(interval);
+    return () => { cancelled = true; };
   }, [consultationId, navigate]);
 
   return (
@@ -87,6 +87,11 @@ export default function DoctorDashboard() {
         if (action === 'accepted') {
           navigate("/doctordashboard/onetoonechat", { state: { consultationId: id } });
         }
+      } else if (res.status === 409) {
+        // Someone else got there first; show where the session actually is
+        const data = await res.json();
+        setConsultations(prev => prev.map(c => c.id === id ? { ...c, status: data.status } : c));
+        toast.error(data.error);
       }
     } catch (err) {
       toast.error("Protocol Execution Failure");
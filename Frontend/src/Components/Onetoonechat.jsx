@@ -16,6 +16,10 @@ export default function OneToOneChat() {
   const [showSummary, setShowSummary] = useState(false); 
   const [summaryText, setSummaryText] = useState("");
   const scrollRef = useRef();
+  const lastIdRef = useRef(null);
+  const skipScrollRef = useRef(false);
+  // before_id for the next older page, null once the start of the chat is loaded
+  const [olderCursor, setOlderCursor] = useState(null);
   
   // Robust User Parsing
   const rawUser = localStorage.getItem("user");
@@ -32,34 +36,104 @@ export default function OneToOneChat() {
     }
   }, [consultationId, myId, navigate, isDoctor]);
 
-  // 2. Polling Logic
+  // 2. Live updates: history via fetch, then server push (polling only as fallback)
   useEffect(() => {
     if (!consultationId || isClosed) return;
 
     const fetchMessages = async () => {
       try {
-        const res = await fetch(`${API_BASE}/otochat/messages/${consultationId}`, {
+        // Only ask for messages newer than the last one we already have
+        const initial = lastIdRef.current === null;
+        const cursor = initial ? "" : `?after_id=${lastIdRef.current}`;
+        const res = await fetch(`${API_BASE}/otochat/messages/${consultationId}${cursor}`, {
           credentials: "include"
         });
         if (res.ok) {
           const data = await res.json();
-          setMessages(data.messages || []);
+          if (initial) setOlderCursor(data.has_more ? data.before_id : null);
+          // Drop anything the push stream already delivered while we waited
+          const fresh = (data.messages || []).filter(
+            m => lastIdRef.current === null || m.id > lastIdRef.current
+          );
+          if (fresh.length > 0) {
+            lastIdRef.current = fresh[fresh.length - 1].id;
+            setMessages(prev => [...prev, ...fresh]);
+          }
           if (data.status === 'completed') {
             setIsClosed(true);
           }
+          // Catch-up pages are capped; keep going until we're current
+          if (!initial && data.has_more) fetchMessages();
         }
       } catch (err) { console.error("Poll failed. Check server connection."); }
     };
 
-    const interval = setInterval(fetchMessages, 2500);
-    return () => clearInterval(interval);
+    let interval = null;
+    const startPolling = () => {
+      if (!interval) interval = setInterval(fetchMessages, 2500);
+    };
+
+    fetchMessages();
+
+    if (typeof EventSource === "undefined") {
+      startPolling();
+      return () => clearInterval(interval);
+    }
+
+    const source = new EventSource(`${API_BASE}/otochat/stream/${consultationId}`, {
+      withCredentials: true
+    });
+
+    source.addEventListener("message", (e) => {
+      const { message } = JSON.parse(e.data);
+      if (lastIdRef.current !== null && message.id <= lastIdRef.current) return;
+      lastIdRef.current = message.id;
+      setMessages(prev => [...prev, message]);
+    });
+
+    source.addEventListener("status", (e) => {
+      const data = JSON.parse(e.data);
+      if (data.status === 'completed') {
+        setIsClosed(true);
+      }
+    });
+
+    // Reconnects resync through the cursor; a dead stream degrades to polling
+    source.onopen = () => fetchMessages();
+    source.onerror = () => {
+      if (source.readyState === EventSource.CLOSED) startPolling();
+    };
+
+    return () => {
+      source.close();
+      clearInterval(interval);
+    };
   }, [consultationId, isClosed]);
 
-  // 3. Auto-scroll
+  // 3. Auto-scroll (not when older history was just prepended)
   useEffect(() => {
+    if (skipScrollRef.current) {
+      skipScrollRef.current = false;
+      return;
+    }
     scrollRef.current?.scrollIntoView({ behavior: "smooth" });
   }, [messages]);
 
+  const loadOlder = async () => {
+    if (!olderCursor) return;
+    try {
+      const res = await fetch(`${API_BASE}/otochat/messages/${consultationId}?before_id=${olderCursor}`, {
+        credentials: "include"
+      });
+      if (res.ok) {
+        const data = await res.json();
+        skipScrollRef.current = true;
+        setMessages(prev => [...(data.messages || []), ...prev]);
+        setOlderCursor(data.has_more ? data.before_id : null);
+      }
+    } catch (err) { toast.error("Could not load earlier messages"); }
+  };
+
   const handleSendMessage = async (e) => {
     e.preventDefault();
     if (!newMessage.trim() || isClosed) return;
@@ -122,6 +196,11 @@ export default function OneToOneChat() {
             <p className="font-black italic uppercase text-sm mt-2">Connecting to secure line...</p>
           </div>
         )}
+        {olderCursor && (
+          <div className="flex justify-center">
+            <button onClick={loadOlder} className="text-[10px] font-black text-emerald-600 underline uppercase tracking-tighter">Load earlier messages</button>
+          </div>
+        )}
         {messages.map((msg) => {
           const isMe = Number(msg.sender_id) === myId;
           return (